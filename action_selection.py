@@ -0,0 +1,56 @@
+import numpy as np
+
+# Epsilon greedy action selection over the available actions of a state.
+# The greedy action is the available action with the maximum Q value. When several
+# available actions share the maximum, the uniform u picks the int(u * no_max)th of
+# them in the order of the available actions, so the Python loop, Batch_grid and the
+# jit kernel choose the same action from the same uniform.
+# The maximum is taken over the available actions only, so any Q values work,
+# however negative.
+
+ALL_ACTIONS = {}
+
+
+def get_all_actions(no_actions):
+    # A shared list of every action, for the steps where all of them are available
+    if no_actions not in ALL_ACTIONS:
+        ALL_ACTIONS[no_actions] = list(range(no_actions))
+    return ALL_ACTIONS[no_actions]
+
+
+def get_greedy_action(q_vals, available_actions, uniform):
+    # q_vals is the Q values of all of the actions of one state, as a list
+    q_max = q_vals[available_actions[0]]
+    no_max = 0
+    for action in available_actions:
+        q_val = q_vals[action]
+        if q_val > q_max:
+            q_max = q_val
+            no_max = 1
+        elif q_val == q_max:
+            no_max += 1
+    nth_max = int(uniform * no_max)
+    for action in available_actions:
+        if q_vals[action] == q_max:
+            if nth_max == 0:
+                return action
+            nth_max -= 1
+
+
+def get_greedy_actions(q_rows, available_actions, uniforms):
+    # Batched get_greedy_action, q_rows has a row of Q values per state and
+    # available_actions a row of the actions available in that state
+    q_vals = np.take_along_axis(q_rows, available_actions, axis=1)
+    is_max = q_vals == q_vals.max(axis=1)[:, None]
+    nth_max = (uniforms * is_max.sum(axis=1)).astype(np.int64)
+    idx = np.argmax(np.cumsum(is_max, axis=1) > nth_max[:, None], axis=1)
+    return available_actions[np.arange(len(idx)), idx]
+
+
+def get_epsilon_greedy_actions(q_rows, available_actions, is_greedy, uniforms):
+    # The greedy action for the rows in is_greedy and a random available action for
+    # the others, both chosen with the uniform of the row
+    greedy_actions = get_greedy_actions(q_rows, available_actions, uniforms)
+    random_idx = (uniforms * available_actions.shape[1]).astype(np.int64)
+    random_actions = available_actions[np.arange(len(random_idx)), random_idx]
+    return np.where(is_greedy, greedy_actions, random_actions)
@@ -0,0 +1,204 @@
+import numpy as np
+from config import Constants
+from grid import Pacman_grid
+from action_selection import get_epsilon_greedy_actions
+from ghosts import get_ghost_actions
+from checkpoint import save_checkpoint
+
+# The arrays holding the episode running in each row, saved in a checkpoint
+ROW_NAMES = ["agent_cell_id", "ghost_cell_ids", "state_space_index", "breadcrumb_cnt", "time_step",
+             "total_reward_per_episode", "done"]
+
+
+class Batch_grid:
+    # Runs B copies of the Pacman grid in lockstep.
+    # Each copy is a row in a set of stacked arrays (agent cell, ghost cell, bitmask of the
+    # breadcrumbs eaten, time step, ...) and every step advances all of the rows at once with
+    # array operations. The rows share the Q table and the policy epsilon of the
+    # Pacman_grid they are built from, and the completed episode statistics are written back
+    # to that grid so that print_results works as before.
+    # The rows draw from the random streams of the Pacman_grid (see random_streams.py).
+    # With B = 1 the episodes are the same as the ones produced by Pacman_grid.step/ghost_step
+    # with the same seed, as both consume the same uniforms of each stream in the same order.
+    def __init__(self, no_envs, pacman_grid=None):
+        if pacman_grid is None:
+            pacman_grid = Pacman_grid()
+        self.grid = pacman_grid
+        self.config = pacman_grid.config
+        self.Q = pacman_grid.Q
+        self.policy = pacman_grid.policy
+        self.rng = pacman_grid.rng
+        self.no_envs = no_envs
+        self.no_cells = pacman_grid.no_cells
+        self.tables = pacman_grid.tables
+        self.agent_cell_id = np.zeros(no_envs, dtype=np.int64)
+        self.ghosts = pacman_grid.ghosts
+        # The cell of each ghost in each row, as (ghosts, rows), one row of -1 with no ghost
+        no_ghosts = self.ghosts.no_ghosts if self.ghosts is not None else 1
+        self.ghost_cell_ids = np.full((no_ghosts, no_envs), -1, dtype=np.int64)
+        # The cell the ghost action of each row moves to
+        self.ghost_action_cell_ids = self.ghost_cell_ids[0]
+        # The bitmask of the breadcrumbs eaten is also the state space index of the Q table
+        self.state_space_index = np.zeros(no_envs, dtype=np.int64)
+        self.breadcrumb_cnt = np.zeros(no_envs, dtype=np.int64)
+        self.time_step = np.zeros(no_envs, dtype=np.int64)
+        self.total_reward_per_episode = np.zeros(no_envs, dtype=np.int64)
+        self.done = np.zeros(no_envs, dtype=bool)
+        self.env_ids = np.arange(no_envs)
+
+    def reset(self, env_ids=None):
+        # Reset the given rows (all of them by default) to the start of an episode
+        if env_ids is None:
+            env_ids = self.env_ids
+        self.agent_cell_id[env_ids] = self.tables.start_cell_id
+        self.state_space_index[env_ids] = 0
+        self.breadcrumb_cnt[env_ids] = 0
+        self.time_step[env_ids] = 0
+        self.total_reward_per_episode[env_ids] = 0
+        self.done[env_ids] = False
+        if self.config.is_ghost:
+            self.set_ghost(env_ids)
+
+    def get_rows(self):
+        return {name: getattr(self, name) for name in ROW_NAMES}
+
+    def set_rows(self, rows):
+        # Carry on with the rows saved by get_rows
+        if rows["agent_cell_id"].shape != self.agent_cell_id.shape or rows["ghost_cell_ids"].shape != self.ghost_cell_ids.shape:
+            raise ValueError(f"The checkpoint has {len(rows['agent_cell_id'])} rows with {len(rows['ghost_cell_ids'])} ghost rows, "
+                             f"not Hyper.no_envs = {self.no_envs} with {len(self.ghost_cell_ids)}")
+        for name in ROW_NAMES:
+            getattr(self, name)[...] = rows[name]
+
+    def set_ghost(self, env_ids):
+        for ghost in range(self.ghosts.no_ghosts):
+            self.ghost_cell_ids[ghost, env_ids] = self.ghosts.get_start_cells(ghost, self.rng.ghost.random_array(len(env_ids)))
+
+    def move_ghost(self):
+        # Each ghost in turn, as Pacman_grid.move_ghost
+        for ghost in range(self.ghosts.no_ghosts):
+            uniforms = self.rng.ghost.random_array(self.no_envs)
+            self.ghost_cell_ids[ghost] = self.ghosts.move(ghost, self.ghost_cell_ids[ghost], self.agent_cell_id, uniforms)
+
+    def is_ghost_cell(self, cell_ids):
+        # The rows whose cell holds a ghost
+        return (self.ghost_cell_ids == cell_ids).any(axis=0)
+
+    def is_breadcrumb(self, cell_ids):
+        # The cells that still hold a breadcrumb
+        breadcrumb_bits = self.tables.breadcrumb_bits[cell_ids]
+        return (breadcrumb_bits != 0) & (self.state_space_index & breadcrumb_bits == 0)
+
+    def get_rewards(self, cell_ids):
+        rewards = self.tables.cell_rewards[cell_ids]
+        rewards = np.where(self.is_breadcrumb(cell_ids), self.tables.breadcrumb_reward, rewards)
+        rewards = np.where(self.is_ghost_cell(cell_ids), self.tables.ghost_reward, rewards)
+        return rewards
+
+    def get_available_actions(self):
+        available_actions = np.broadcast_to(np.arange(4), (self.no_envs, 4))
+        if self.config.is_ghost:
+            # Replace a move onto a ghost by the ghost action
+            is_ghost, self.ghost_action_cell_ids = get_ghost_actions(self.tables.neighbour_cells[self.agent_cell_id], self.ghost_cell_ids)
+            available_actions = np.where(is_ghost, Constants.GHOST, available_actions)
+        return available_actions
+
+    def get_actions(self, available_actions):
+        # Epsilon greedy choice over the available actions of every row.
+        # A greedy row breaks ties for the maximum Q value with a uniform from the tie break
+        # stream, as Q_learn.get_available_action_for_max_q, and any other row picks its
+        # action with a second uniform from the exploration stream, as Policy.
+        is_greedy = self.rng.exploration.random_array(self.no_envs) > self.policy.epsilon
+        no_greedy = np.count_nonzero(is_greedy)
+        action_uniforms = np.empty(self.no_envs, dtype=np.float64)
+        action_uniforms[is_greedy] = self.rng.tie_break.random_array(no_greedy)
+        action_uniforms[~is_greedy] = self.rng.exploration.random_array(self.no_envs - no_greedy)
+        q_rows = self.Q.Q_table.get_rows(self.agent_cell_id, self.state_space_index)
+        return get_epsilon_greedy_actions(q_rows, available_actions, is_greedy, action_uniforms)
+
+    def update(self, old_cell_ids, new_cell_ids, actions, rewards):
+        # Batched version of Q_learn.update. If several rows update the same entry
+        # in the same step, the last one wins.
+        Q_table = self.Q.Q_table
+        q_old = Q_table.get_values(old_cell_ids, self.state_space_index, actions).astype(np.float64)
+        q_max = Q_table.get_rows(new_cell_ids, self.state_space_index).max(axis=1).astype(np.float64)
+        Q_table.set_values(old_cell_ids, self.state_space_index, actions, q_old + self.config.alpha * (rewards + self.config.gamma * q_max - q_old))
+
+    def agent_step(self, new_cell_ids):
+        # Rows moving onto an obstacle stay where they are, unless a ghost is on it
+        is_moving = ~self.tables.is_obstacle[new_cell_ids] | self.is_ghost_cell(new_cell_ids)
+        # Leaving a breadcrumb cell eats the breadcrumb
+        is_eaten = is_moving & self.is_breadcrumb(self.agent_cell_id)
+        self.state_space_index |= np.where(is_eaten, self.tables.breadcrumb_bits[self.agent_cell_id], 0)
+        self.breadcrumb_cnt += is_eaten
+        self.agent_cell_id = np.where(is_moving, new_cell_ids, self.agent_cell_id)
+        np.add.at(self.grid.cell_counter, new_cell_ids[is_moving], 1)
+
+    def step(self):
+        # Advance every row by one time step and return the mask of rows whose episode ended
+        self.time_step += 1
+        if self.config.is_ghost:
+            self.move_ghost()
+        available_actions = self.get_available_actions()
+        actions = self.get_actions(available_actions)
+        is_ghost_action = actions == Constants.GHOST
+        new_cell_ids = np.where(is_ghost_action, self.ghost_action_cell_ids, self.tables.move_cells[self.agent_cell_id, np.where(is_ghost_action, 0, actions)])
+        rewards = self.get_rewards(new_cell_ids)
+        self.total_reward_per_episode += rewards
+        self.update(self.agent_cell_id, new_cell_ids, actions, rewards)
+        old_cell_ids = self.agent_cell_id
+        old_indexes = self.state_space_index.copy()
+        self.agent_step(new_cell_ids)
+
+        self.is_caught = self.is_ghost_cell(self.agent_cell_id)
+        self.is_lost = self.is_caught | (self.time_step > self.tables.max_time_steps)
+        self.is_won = ~self.is_lost & (self.breadcrumb_cnt == self.tables.no_breadcrumbs)
+        self.done = self.is_lost | self.is_won
+        replay = self.grid.replay
+        if replay is not None:
+            # As Pacman_grid.remember, a step cut short by the time step limit is not done
+            is_done = self.is_caught | (self.breadcrumb_cnt == self.tables.no_breadcrumbs)
+            replay.add_batch(old_cell_ids, old_indexes, actions, rewards, self.agent_cell_id, self.state_space_index, is_done)
+            replay.replay(self.Q.Q_table)
+        return self.done
+
+    def save_episode_stats(self, env_ids):
+        grid = self.grid
+        epsilons = np.full(len(env_ids), self.policy.epsilon)
+        grid.metrics.add_batch(self.time_step[env_ids], self.total_reward_per_episode[env_ids], self.is_won[env_ids], epsilons, self.is_caught[env_ids])
+        grid.no_episodes = grid.metrics.no_episodes
+
+    def run(self, total_episodes, first_episode=0):
+        # Step all rows until the episodes from first_episode up to total_episodes have completed.
+        # Finished rows are reset straight away, so the rows drift out of phase
+        # with each other. Episodes still running at the end are discarded.
+        # A checkpoint is saved once every config.checkpoint_interval episodes, at the first
+        # step that reaches the next multiple. The episodes still running are saved with it,
+        # so a run resumed from it carries on with them and continues as if never stopped.
+        interval = self.config.checkpoint_interval
+        if self.grid.batch_rows is None:
+            self.reset()
+        else:
+            self.set_rows(self.grid.batch_rows)
+            self.grid.batch_rows = None
+            # The rows that had finished are reset, as they would have been after the save
+            self.reset(np.flatnonzero(self.done))
+        episodes = first_episode
+        while episodes < total_episodes:
+            done = self.step()
+            self.policy.update_epsilon()
+            env_ids = np.flatnonzero(done)
+            if len(env_ids) == 0:
+                continue
+            env_ids = env_ids[:total_episodes - episodes]
+            self.save_episode_stats(env_ids)
+            last_episodes = episodes
+            episodes += len(env_ids)
+            if self.config.print_episodes:
+                self.grid.episode_log.add_batch(episodes, self.time_step[env_ids], self.total_reward_per_episode[env_ids],
+                                                np.full(len(env_ids), self.policy.epsilon), self.is_won[env_ids], self.is_caught[env_ids])
+            if interval > 0 and episodes // interval > last_episodes // interval:
+                save_checkpoint(self.grid, episodes, batch_rows=self.get_rows())
+            if episodes < total_episodes:
+                self.reset(env_ids)
+        return episodes - first_episode
@@ -0,0 +1,102 @@
+import os
+import json
+import shutil
+import numpy as np
+from metrics import EPISODE_DTYPE
+
+# Save and resume a training run.
+# A checkpoint is a directory holding the Q table as .npy files (see Q_table.save) and
+# state.npz with everything else needed to carry on: the episodes completed, the
+# policy epsilon, the steps per cell and the state of the random streams of the grid,
+# and replay.npz with the replay buffer when the replay setting is on.
+# A checkpoint saved by Batch_grid also holds the episodes still running in its rows, which
+# are put in pacman_grid.batch_rows on load for Batch_grid.run to carry on with.
+# The settings come from the config of the Pacman_grid.
+# The episode metrics written to config.metrics_path are flushed with the checkpoint and
+# the ones after it are dropped on resume. Metrics only held in memory are saved in state.npz.
+# The Q table is memory mapped when loaded, so a large table opens straight away and is
+# only read from disk as it is used.
+# Loading a checkpoint and running the remaining episodes gives the same results as a run
+# that was never stopped.
+
+# The settings that must match for a checkpoint to be loaded
+CHECKED_SETTINGS = ["N", "no_breadcrumbs", "is_ghost", "ghost_modes", "ghost_greedy", "q_table", "q_dtype", "q_int16_step",
+                    "layout", "layout_obstacle_density", "layout_seed", "replay", "replay_capacity", "replay_prioritized"]
+
+
+def save_checkpoint(pacman_grid, episodes, path=None, batch_rows=None):
+    if path is None:
+        path = pacman_grid.config.checkpoint_path
+    # Write to a new directory and swap it in, so a crash while saving
+    # leaves the previous checkpoint in place
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    pacman_grid.Q.Q_table.save(tmp_path)
+    if pacman_grid.replay is not None:
+        pacman_grid.replay.save(tmp_path)
+    metrics = pacman_grid.metrics
+    metrics.flush()
+    # Metrics with no path are only held in memory, so they go in the checkpoint
+    records = metrics.read() if not metrics.path else np.zeros(0, dtype=EPISODE_DTYPE)
+    settings = {f"setting_{name}": getattr(pacman_grid.config, name) for name in CHECKED_SETTINGS}
+    rows = {f"batch_{name}": value for name, value in (batch_rows or {}).items()}
+    np.savez(
+        os.path.join(tmp_path, "state.npz"),
+        episodes=episodes,
+        no_episodes=pacman_grid.no_episodes,
+        epsilon=pacman_grid.policy.epsilon,
+        records=records,
+        env_counter=pacman_grid.env_counter,
+        rng_state=json.dumps(pacman_grid.rng.get_state()),
+        **settings,
+        **rows)
+    old_path = path + ".old"
+    if os.path.exists(path):
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def get_mismatched_settings(config, path):
+    # The CHECKED_SETTINGS of the checkpoint in path that differ from config, as
+    # (name, saved value, value in config)
+    mismatched = []
+    with np.load(os.path.join(path, "state.npz")) as state:
+        for name in CHECKED_SETTINGS:
+            # A tuple setting, such as ghost_modes, is saved as an array
+            saved = state[f"setting_{name}"].tolist()
+            if isinstance(saved, list):
+                saved = tuple(saved)
+            setting = getattr(config, name)
+            if saved != setting:
+                mismatched.append((name, saved, setting))
+    return mismatched
+
+
+def load_checkpoint(pacman_grid, path=None):
+    # Restore the checkpoint into pacman_grid and return the number of episodes completed
+    if path is None:
+        path = pacman_grid.config.checkpoint_path
+    mismatched = get_mismatched_settings(pacman_grid.config, path)
+    if mismatched:
+        name, saved, setting = mismatched[0]
+        raise ValueError(f"The checkpoint in {path} has Hyper.{name} = {saved}, not {setting}")
+    with np.load(os.path.join(path, "state.npz")) as state:
+        pacman_grid.Q.Q_table.load(path)
+        if pacman_grid.replay is not None:
+            pacman_grid.replay.load(path)
+        episodes = int(state["episodes"])
+        pacman_grid.no_episodes = int(state["no_episodes"])
+        pacman_grid.policy.epsilon = float(state["epsilon"])
+        pacman_grid.metrics.resume(episodes, state["records"])
+        pacman_grid.env_counter[:] = state["env_counter"]
+        pacman_grid.rng.set_state(json.loads(str(state["rng_state"])))
+        rows = {name[len("batch_"):]: state[name] for name in state.files if name.startswith("batch_")}
+        pacman_grid.batch_rows = rows or None
+    return episodes
+
+
+def is_checkpoint_due(episodes, config):
+    return config.checkpoint_interval > 0 and episodes % config.checkpoint_interval == 0
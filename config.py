@@ -1,10 +1,21 @@
+from collections import namedtuple
+
+
 
 class Hyper:
     total_episodes = 500
     # N is the number of cells in the side of the grid.
-    # If you change it, remember to change the cell locations
+    # If you change it, remember to change the layout below
     # for the breadcrumbs and obstacles. It needs to be an odd number.
     N = 7
+    # Where the obstacles and breadcrumbs go, see layouts.py: "default" for the cells in Constants
+    # (N = 7 only), "generated" for a random map of any odd N, or the name of a layout file.
+    # A generated map has layout_obstacle_density of the cells inside the border as obstacles,
+    # placed with layout_seed, and is cached in the layout_cache directory.
+    layout = "default"
+    layout_obstacle_density = 0.15
+    layout_seed = 0
+    layout_cache = "layout_cache"
     gamma = 0.51
     alpha = 0.8
     init_epsilon = 0.95
@@ -14,6 +25,135 @@ class Hyper:
     is_ghost = True
     show_step = False
     print_episodes = True
+    # With is_ghost, one ghost for each of ghost_modes: "random" moves at random over every
+    # cell as the original ghost, "chase" walks the free cells towards the agent and "scatter"
+    # towards its corner. A chase or scatter ghost takes a shortest path step with probability
+    # ghost_greedy, otherwise a random one, see ghosts.py.
+    ghost_modes = ["random"]
+    ghost_greedy = 0.8
+    # Number of grids run in lockstep by Batch_grid.
+    # 1 runs the original one grid at a time loop.
+    no_envs = 1
+    # Run the episodes through the compiled kernel in jit_grid.py, in blocks of
+    # jit_block_episodes. Needs numba and the dense Q table, otherwise the Python loop is used.
+    use_jit = False
+    jit_block_episodes = 1000
+    # Save a checkpoint to checkpoint_path every checkpoint_interval episodes (0 for never),
+    # and with resume set, carry on from the checkpoint if there is one.
+    # Used by the one grid at a time loop, the jit loop and Batch_grid, where a checkpoint
+    # is saved at the first step past each interval with the episodes running in its rows.
+    checkpoint_interval = 0
+    checkpoint_path = "checkpoints/pacman"
+    resume = False
+    # The statistics of each episode are collected in chunks of metrics_chunk_size episodes
+    # and each chunk is written to the metrics_path directory, see metrics.py. With
+    # metrics_path = None the chunks are kept in memory instead, for short runs only.
+    metrics_path = "metrics"
+    metrics_chunk_size = 10000
+    # Logging, see run_log.py. Messages at log_level and above go to the console, unless
+    # log_console is off, and with a log_path are appended to that file through a buffer of
+    # log_buffer_records records. With print_episodes the episode results are summarised at
+    # most once every log_interval_seconds seconds, or every log_interval_episodes episodes
+    # if that is above 0 (both 0 for a line per episode). DEBUG also logs every loss to the ghost.
+    log_level = "INFO"
+    log_console = True
+    log_path = None
+    log_buffer_records = 1000
+    log_interval_seconds = 1.0
+    log_interval_episodes = 0
+    # Time the phases of the Python loop of main.py in blocks of profile_block_episodes
+    # episodes, see profiler.py. With a profile_path the loop is also run under cProfile
+    # and written to <profile_path>.pstats and <profile_path>.folded
+    profile = False
+    profile_block_episodes = 100
+    profile_path = None
+    # Number of episodes in the moving averages
+    rolling_window = 100
+    # Value iteration over the model of the grid without the ghost, see planner.py and main_plan.py.
+    # With warm_start, main.py starts training from the planned Q table.
+    plan_tolerance = 1e-9
+    plan_max_iterations = 10000
+    warm_start = False
+    # Greedy evaluation of a trained Q table, see evaluate.py. main_evaluate.py evaluates the
+    # Q table of the checkpoint in checkpoint_path, and main.py the table it has just trained
+    # when evaluate_after_training is set.
+    eval_episodes = 10000
+    eval_epsilon = 0.0
+    eval_seed = 1
+    eval_batch_size = 1000
+    evaluate_after_training = False
+    # Experience replay, see replay_buffer.py. The last replay_capacity steps are kept and
+    # replay_ratio of them are replayed per step, in minibatches of replay_batch_size.
+    # replay_prioritized samples them by TD error, with the priority exponent
+    # replay_priority_alpha, the importance sampling exponent replay_priority_beta and
+    # replay_priority_epsilon added to each |TD error|. Not used by the jit loop.
+    replay = False
+    replay_capacity = 100000
+    replay_ratio = 1.0
+    replay_batch_size = 32
+    replay_prioritized = False
+    replay_priority_alpha = 0.6
+    replay_priority_beta = 0.4
+    replay_priority_epsilon = 0.01
+    # Draw the figures at the end of main.py in a separate process, see report.py
+    report_in_background = False
+    # Storage for the Q table, "dense" or "sparse".
+    # The dense table has 2**no_breadcrumbs rows per cell, use sparse for a lot of breadcrumbs.
+    q_table = "dense"
+    # Precision of the Q values: "float64", "float32", "float16", or "int16" in steps of q_int16_step.
+    # main_q_dtype_report.py compares them against float64.
+    q_dtype = "float64"
+    q_int16_step = 0.05
+    q_dtype_report = ["float64", "float32", "float16", "int16"]
+    # Before allocating a dense Q table larger than q_memory_fraction of the free memory,
+    # "error" refuses, "warn" prints a warning and "off" skips the check
+    q_memory_check = "error"
+    q_memory_fraction = 0.8
+    # Base seed for the random numbers, a tuning trial uses seed + trial number
+    seed = 0
+    # The uniforms of each random stream are drawn in blocks of this size, see random_streams.py
+    rng_block_size = 4096
+    # With no_seeds > 1, main.py trains seeds seed to seed + no_seeds - 1 in seed_workers processes
+    # (None for one per CPU) and reports the mean and confidence interval, see multi_seed.py.
+    # A tuning trial trains tune_seeds seeds in the same way.
+    no_seeds = 1
+    seed_workers = None
+    # Hyperparameter tuning, see main_hyper_tune.py and main_parallel_tune.py
+    tune_trials = 10000
+    tune_workers = 8
+    tune_study_name = "pacman"
+    tune_seeds = 1
+    # With tune_batch_size > 1, tune_batch_size trials are asked for at a time and trained
+    # together in one Config_batch (see config_batch.py). Needs tune_seeds = 1.
+    tune_batch_size = 1
+    # A journal file, or a database URL such as sqlite:///pacman_tune.db
+    tune_storage = "pacman_tune.log"
+    # The objective reports the rolling reward every prune_interval episodes.
+    # A trial can be pruned once prune_warmup_episodes episodes have run and
+    # prune_startup_trials trials have completed.
+    prune_interval = 50
+    prune_warmup_episodes = 100
+    prune_startup_trials = 5
+    # Successive halving sweep, see sweep.py and main_sweep.py. sweep_configs random
+    # configurations start on sweep_min_episodes episodes, the best 1 / sweep_eta of them
+    # carry on for sweep_eta times as many episodes until total_episodes, continuing from
+    # their checkpoints in sweep_path. sweep_mode is "halving" or "hyperband".
+    sweep_configs = 27
+    sweep_min_episodes = 20
+    sweep_eta = 3
+    sweep_workers = None
+    sweep_path = "sweep"
+    sweep_mode = "halving"
+    # Benchmarks, see main_benchmark.py. Every combination of the grid sizes,
+    # numbers of breadcrumbs and ghost settings is run for benchmark_episodes episodes.
+    # The function timings are the best of benchmark_repeats runs of benchmark_calls calls.
+    benchmark_N = [7, 11, 15]
+    benchmark_breadcrumbs = [4, 7, 10]
+    benchmark_ghost = [False, True]
+    benchmark_episodes = 200
+    benchmark_calls = 100000
+    benchmark_repeats = 3
+    benchmark_path = "benchmark.json"
 
     [staticmethod]   
     def display():
@@ -53,4 +193,29 @@ class Constants:
     # The breadcrumb cells selected depends on Hyper.no_breadcrumbs value
     BREADCRUMB_CELL_IDS = [17, 12, 40, 38, 15, 23, 31, 22, 10, 19, 29, 36, 18, 9, 33, 37, 26]
     WIN_CELL = 0
-    LOSE_CELL = 1
\ No newline at end of file
+    LOSE_CELL = 1
+
+
+# The hyperparameters tuned by main_hyper_tune.py and sweep.py and the range of each
+SEARCH_SPACE = {
+    "gamma": (0.01, 0.99),
+    "alpha": (0.01, 0.99),
+    "init_epsilon": (0.9, 1),
+    "epsilon_threshold": (0.001, 0.1),
+    "decay": (0.990, 0.999)}
+
+
+# The settings of one run, fixed when the run starts.
+# Pacman_grid, Q_learn, Policy and the modules they use read a Config rather than Hyper,
+# so runs with different settings can share a process. get_config takes the values in
+# Hyper, with any of them overridden, and config._replace(name=value) makes a changed copy.
+# A Config is a namedtuple, so it cannot be changed and can be sent to another process.
+HYPER_NAMES = [name for name, value in vars(Hyper).items() if not name.startswith("_") and not callable(value)]
+Config = namedtuple("Config", HYPER_NAMES)
+
+
+def get_config(**overrides):
+    settings = {name: getattr(Hyper, name) for name in HYPER_NAMES}
+    settings.update(overrides)
+    # Lists become tuples so that nothing in a Config can change
+    return Config(**{name: tuple(value) if isinstance(value, list) else value for name, value in settings.items()})
@@ -0,0 +1,184 @@
+import numpy as np
+from config import Constants
+from grid import Pacman_grid
+from random_streams import Stacked_uniform_stream
+from action_selection import get_epsilon_greedy_actions
+from q_table import check_memory
+
+# The settings every configuration of a Config_batch must share, the grid and the Q table
+SHARED_SETTINGS = ["N", "no_breadcrumbs", "is_ghost", "layout", "layout_obstacle_density", "layout_seed", "q_table", "q_dtype"]
+
+
+class Config_batch:
+    # Trains K configurations at once, for tuning.
+    # Each configuration k is a Pacman_grid(seeds[k], configs[k]) that keeps its own Q table,
+    # policy epsilon, random streams and episode metrics, as if it were trained on its own.
+    # The K Q tables are slices of one stacked array of shape (K, cells, state space indexes,
+    # actions), the steps per cell likewise, and alpha, gamma, epsilon, decay and the epsilon
+    # threshold are vectors over k, so one step of array operations moves all K learners
+    # (as Batch_grid moves B episodes of one learner).
+    # A configuration only steps while it has episodes left, and draws its uniforms from its
+    # own streams in the order the Python loop does (see Stacked_uniform_stream), so its
+    # Q table and episodes are the same as train_grid(Pacman_grid(seeds[k], configs[k])).
+    # The configurations may differ in anything but SHARED_SETTINGS, and need the dense Q
+    # table with a float dtype, no replay buffer and the one random ghost. Configurations
+    # writing their metrics must each have their own metrics_path.
+    def __init__(self, configs, seeds=None):
+        if seeds is None:
+            seeds = [config.seed for config in configs]
+        for name in SHARED_SETTINGS:
+            if len(set(getattr(config, name) for config in configs)) > 1:
+                raise ValueError(f"The configurations of a Config_batch must have the same {name}")
+        metrics_paths = [config.metrics_path for config in configs if config.metrics_path]
+        if len(set(metrics_paths)) < len(metrics_paths):
+            raise ValueError("Each configuration of a Config_batch needs its own metrics_path, or none")
+        config = configs[0]
+        if config.q_table != "dense" or config.q_dtype == "int16" or any(config.replay for config in configs):
+            raise ValueError("A Config_batch needs the dense Q table with a float dtype and no replay buffer")
+        if config.is_ghost and any(tuple(config.ghost_modes) != ("random",) for config in configs):
+            raise ValueError("A Config_batch only moves the one random ghost, set Hyper.ghost_modes = [\"random\"]")
+        self.grids = [Pacman_grid(seed, config) for seed, config in zip(seeds, configs)]
+        self.no_configs = len(configs)
+        self.tables = self.grids[0].tables
+        self.is_ghost = config.is_ghost
+        # The stacked tables, each grid gets a view of its slice so that anything reading
+        # the grid afterwards (evaluation, checkpoints, the report) sees the trained values
+        Q_table = self.grids[0].Q.Q_table
+        check_memory(self.no_configs * Q_table.values.nbytes, config)
+        self.Q_values = np.zeros((self.no_configs,) + Q_table.shape, dtype=Q_table.values.dtype)
+        self.cell_counter = np.zeros((self.no_configs, self.tables.no_cells), dtype=self.grids[0].cell_counter.dtype)
+        # The Q values as rows of actions, the row of (k, cell, index) is
+        # (k * no_cells + cell) * no_indexes + index
+        self.Q_rows = self.Q_values.reshape(-1, Q_table.shape[2])
+        self.no_indexes = Q_table.shape[1]
+        for k, grid in enumerate(self.grids):
+            self.Q_values[k] = grid.Q.Q_table.values
+            grid.Q.Q_table.values = self.Q_values[k]
+            self.cell_counter[k] = grid.cell_counter
+            grid.cell_counter = self.cell_counter[k]
+            grid.env_counter = self.cell_counter[k].reshape(grid.env_counter.shape)
+        self.alpha = np.array([config.alpha for config in configs], dtype=np.float64)
+        self.gamma = np.array([config.gamma for config in configs], dtype=np.float64)
+        self.decay = np.array([config.decay for config in configs], dtype=np.float64)
+        self.epsilon_threshold = np.array([config.epsilon_threshold for config in configs], dtype=np.float64)
+        self.epsilon = np.array([grid.policy.epsilon for grid in self.grids], dtype=np.float64)
+        self.total_episodes = np.array([config.total_episodes for config in configs], dtype=np.int64)
+        self.exploration = Stacked_uniform_stream([grid.rng.exploration for grid in self.grids])
+        self.tie_break = Stacked_uniform_stream([grid.rng.tie_break for grid in self.grids])
+        self.ghost = Stacked_uniform_stream([grid.rng.ghost for grid in self.grids])
+        self.agent_cell_id = np.zeros(self.no_configs, dtype=np.int64)
+        self.ghost_cell_id = np.full(self.no_configs, -1, dtype=np.int64)
+        # The bitmask of the breadcrumbs eaten is also the state space index of the Q table
+        self.state_space_index = np.zeros(self.no_configs, dtype=np.int64)
+        self.breadcrumb_cnt = np.zeros(self.no_configs, dtype=np.int64)
+        self.time_step = np.zeros(self.no_configs, dtype=np.int64)
+        self.total_reward_per_episode = np.zeros(self.no_configs, dtype=np.int64)
+        self.no_episodes = np.zeros(self.no_configs, dtype=np.int64)
+
+    def reset(self, rows):
+        self.agent_cell_id[rows] = self.tables.start_cell_id
+        self.state_space_index[rows] = 0
+        self.breadcrumb_cnt[rows] = 0
+        self.time_step[rows] = 0
+        self.total_reward_per_episode[rows] = 0
+        if self.is_ghost:
+            idx = (self.ghost.random(rows) * len(self.tables.border_cell_ids)).astype(np.int64)
+            self.ghost_cell_id[rows] = self.tables.border_cell_ids[idx]
+
+    def step(self, rows):
+        # Advance the configurations in rows by one time step, as Batch_grid.step.
+        # Returns the masks over rows of the episodes that are lost and won.
+        tables = self.tables
+        self.time_step[rows] += 1
+        agent_cell_id = self.agent_cell_id[rows]
+        state_space_index = self.state_space_index[rows]
+        available_actions = np.broadcast_to(np.arange(4), (len(rows), 4))
+        if self.is_ghost:
+            ghost_cell_id = self.ghost_cell_id[rows]
+            idx = (self.ghost.random(rows) * tables.ghost_no_moves[ghost_cell_id]).astype(np.int64)
+            ghost_cell_id = tables.ghost_moves[ghost_cell_id, idx]
+            self.ghost_cell_id[rows] = ghost_cell_id
+            is_ghost = tables.neighbour_cells[agent_cell_id] == ghost_cell_id[:, None]
+            available_actions = np.where(is_ghost, Constants.GHOST, available_actions)
+        else:
+            ghost_cell_id = self.ghost_cell_id[rows]
+        # Epsilon greedy as Batch_grid.get_actions, each row with its own epsilon and streams
+        is_greedy = self.exploration.random(rows) > self.epsilon[rows]
+        uniforms = np.empty(len(rows), dtype=np.float64)
+        uniforms[is_greedy] = self.tie_break.random(rows[is_greedy])
+        uniforms[~is_greedy] = self.exploration.random(rows[~is_greedy])
+        row_offsets = rows * tables.no_cells
+        old_rows = (row_offsets + agent_cell_id) * self.no_indexes + state_space_index
+        actions = get_epsilon_greedy_actions(self.Q_rows[old_rows], available_actions, is_greedy, uniforms)
+
+        is_ghost_action = actions == Constants.GHOST
+        new_cell_ids = np.where(is_ghost_action, ghost_cell_id, tables.move_cells[agent_cell_id, np.where(is_ghost_action, 0, actions)])
+        breadcrumb_bits = tables.breadcrumb_bits[new_cell_ids]
+        is_breadcrumb = (breadcrumb_bits != 0) & (state_space_index & breadcrumb_bits == 0)
+        rewards = np.where(is_breadcrumb, tables.breadcrumb_reward, tables.cell_rewards[new_cell_ids])
+        rewards = np.where(new_cell_ids == ghost_cell_id, tables.ghost_reward, rewards)
+        self.total_reward_per_episode[rows] += rewards
+
+        # Q_learn.update with the alpha and gamma of each row, worked out in float64
+        q_old = self.Q_rows[old_rows, actions].astype(np.float64)
+        q_max = self.Q_rows[(row_offsets + new_cell_ids) * self.no_indexes + state_space_index].max(axis=1).astype(np.float64)
+        self.Q_rows[old_rows, actions] = q_old + self.alpha[rows] * (rewards + self.gamma[rows] * q_max - q_old)
+
+        # As Pacman_grid.agent_step, leaving a breadcrumb cell eats it
+        is_moving = ~tables.is_obstacle[new_cell_ids] | (new_cell_ids == ghost_cell_id)
+        breadcrumb_bits = tables.breadcrumb_bits[agent_cell_id]
+        is_eaten = is_moving & (breadcrumb_bits != 0) & (state_space_index & breadcrumb_bits == 0)
+        self.state_space_index[rows] = state_space_index | np.where(is_eaten, breadcrumb_bits, 0)
+        self.breadcrumb_cnt[rows] += is_eaten
+        agent_cell_id = np.where(is_moving, new_cell_ids, agent_cell_id)
+        self.agent_cell_id[rows] = agent_cell_id
+        # Each configuration is in rows once, so no cell is counted twice
+        self.cell_counter[rows[is_moving], new_cell_ids[is_moving]] += 1
+
+        # Policy.update_epsilon, after every step
+        epsilon = self.epsilon[rows]
+        self.epsilon[rows] = np.where(epsilon > self.epsilon_threshold[rows], epsilon * self.decay[rows], epsilon)
+
+        is_caught = ghost_cell_id == agent_cell_id
+        is_lost = is_caught | (self.time_step[rows] > tables.max_time_steps)
+        is_won = ~is_lost & (self.breadcrumb_cnt[rows] == tables.no_breadcrumbs)
+        return is_lost, is_won, is_caught
+
+    def save_episode_stats(self, k, is_won, is_caught):
+        grid = self.grids[k]
+        grid.metrics.add(self.time_step[k], self.total_reward_per_episode[k], is_won, self.epsilon[k], is_caught)
+        self.no_episodes[k] += 1
+        grid.no_episodes = grid.metrics.no_episodes
+
+    def run(self, callback=None):
+        # Train every configuration for its total_episodes episodes.
+        # callback(k, grid) is called after each episode of configuration k, with the grid
+        # updated to the end of the episode, and stops that configuration by returning True
+        # (to prune a tuning trial).
+        rows = np.flatnonzero(self.total_episodes > 0)
+        self.reset(rows)
+        while len(rows) > 0:
+            is_lost, is_won, is_caught = self.step(rows)
+            is_done = is_lost | is_won
+            if not is_done.any():
+                continue
+            is_stopped = np.zeros(len(rows), dtype=bool)
+            for i in np.flatnonzero(is_done).tolist():
+                k = rows[i]
+                self.save_episode_stats(k, bool(is_won[i]), bool(is_caught[i]))
+                is_stopped[i] = self.no_episodes[k] == self.total_episodes[k]
+                if callback is not None:
+                    self.grids[k].policy.epsilon = float(self.epsilon[k])
+                    is_stopped[i] |= bool(callback(k, self.grids[k]))
+            self.reset(rows[is_done & ~is_stopped])
+            rows = rows[~is_stopped]
+        self.sync()
+        return self.grids
+
+    def sync(self):
+        # Hand the epsilons and the positions of the random streams back to the grids
+        for k, grid in enumerate(self.grids):
+            grid.policy.epsilon = float(self.epsilon[k])
+        self.exploration.sync()
+        self.tie_break.sync()
+        self.ghost.sync()
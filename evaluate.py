@@ -0,0 +1,119 @@
+import numpy as np
+from config import Constants
+from random_streams import Random_streams
+from action_selection import get_epsilon_greedy_actions
+from ghosts import get_ghost_actions
+
+# Judge a trained agent by running episodes with its Q table frozen. The settings are the
+# config of the Pacman_grid that owns the Q table.
+# There are no Q updates, no steps per cell and no printing. The episodes are run in
+# batches of config.eval_batch_size side by side, as in Batch_grid, and a batch only works
+# on its episodes that are still running. The actions are greedy with ties broken at
+# random, or epsilon greedy with config.eval_epsilon above 0.
+# The random numbers come from streams seeded with config.eval_seed, apart from the ones
+# used in training, so the same Q table always gives the same evaluation.
+
+
+class Greedy_evaluator:
+    def __init__(self, pacman_grid, epsilon=None, seed=None):
+        self.config = pacman_grid.config
+        self.tables = pacman_grid.tables
+        self.ghosts = pacman_grid.ghosts
+        self.Q_table = pacman_grid.Q.Q_table
+        self.epsilon = self.config.eval_epsilon if epsilon is None else epsilon
+        self.rng = Random_streams(self.config.eval_seed if seed is None else seed, self.config.rng_block_size)
+
+    def run(self, no_episodes):
+        # The steps, reward and result of each of no_episodes episodes
+        steps = np.zeros(no_episodes, dtype=np.int64)
+        rewards = np.zeros(no_episodes, dtype=np.int64)
+        is_won = np.zeros(no_episodes, dtype=bool)
+        is_caught = np.zeros(no_episodes, dtype=bool)
+        for first in range(0, no_episodes, self.config.eval_batch_size):
+            last = min(first + self.config.eval_batch_size, no_episodes)
+            self.run_batch(steps[first:last], rewards[first:last], is_won[first:last], is_caught[first:last])
+        return {"steps": steps, "reward": rewards, "won": is_won, "caught": is_caught}
+
+    def run_batch(self, steps, rewards, is_won, is_caught):
+        tables = self.tables
+        no_envs = len(steps)
+        # The state of the episodes still running, the finished ones are dropped each step
+        env_ids = np.arange(no_envs)
+        agent_cell_id = np.full(no_envs, tables.start_cell_id, dtype=np.int64)
+        state_space_index = np.zeros(no_envs, dtype=np.int64)
+        breadcrumb_cnt = np.zeros(no_envs, dtype=np.int64)
+        total_reward = np.zeros(no_envs, dtype=np.int64)
+        # The cell of each ghost in each episode, as (ghosts, episodes)
+        ghost_cell_ids = np.full((1, no_envs), -1, dtype=np.int64)
+        if self.config.is_ghost:
+            ghost_cell_ids = np.stack([self.ghosts.get_start_cells(ghost, self.rng.ghost.random_array(no_envs))
+                                       for ghost in range(self.ghosts.no_ghosts)])
+        time_step = 0
+        while len(env_ids) > 0:
+            time_step += 1
+            no_running = len(env_ids)
+            available_actions = np.broadcast_to(np.arange(4), (no_running, 4))
+            ghost_action_cell_ids = ghost_cell_ids[0]
+            if self.config.is_ghost:
+                for ghost in range(self.ghosts.no_ghosts):
+                    uniforms = self.rng.ghost.random_array(no_running)
+                    ghost_cell_ids[ghost] = self.ghosts.move(ghost, ghost_cell_ids[ghost], agent_cell_id, uniforms)
+                is_ghost, ghost_action_cell_ids = get_ghost_actions(tables.neighbour_cells[agent_cell_id], ghost_cell_ids)
+                available_actions = np.where(is_ghost, Constants.GHOST, available_actions)
+            is_greedy = self.rng.exploration.random_array(no_running) >= self.epsilon
+            uniforms = self.rng.tie_break.random_array(no_running)
+            q_rows = self.Q_table.get_rows(agent_cell_id, state_space_index)
+            actions = get_epsilon_greedy_actions(q_rows, available_actions, is_greedy, uniforms)
+
+            is_ghost_action = actions == Constants.GHOST
+            new_cell_ids = np.where(is_ghost_action, ghost_action_cell_ids, tables.move_cells[agent_cell_id, np.where(is_ghost_action, 0, actions)])
+            breadcrumb_bits = tables.breadcrumb_bits[new_cell_ids]
+            is_breadcrumb = (breadcrumb_bits != 0) & (state_space_index & breadcrumb_bits == 0)
+            reward = np.where(is_breadcrumb, tables.breadcrumb_reward, tables.cell_rewards[new_cell_ids])
+            total_reward += np.where((ghost_cell_ids == new_cell_ids).any(axis=0), tables.ghost_reward, reward)
+
+            # As Pacman_grid.agent_step, leaving a breadcrumb cell eats it
+            is_moving = ~tables.is_obstacle[new_cell_ids] | (ghost_cell_ids == new_cell_ids).any(axis=0)
+            breadcrumb_bits = tables.breadcrumb_bits[agent_cell_id]
+            is_eaten = is_moving & (breadcrumb_bits != 0) & (state_space_index & breadcrumb_bits == 0)
+            state_space_index |= np.where(is_eaten, breadcrumb_bits, 0)
+            breadcrumb_cnt += is_eaten
+            agent_cell_id = np.where(is_moving, new_cell_ids, agent_cell_id)
+
+            caught = (ghost_cell_ids == agent_cell_id).any(axis=0)
+            won = ~caught & (time_step <= tables.max_time_steps) & (breadcrumb_cnt == tables.no_breadcrumbs)
+            done = caught | won | (time_step > tables.max_time_steps)
+            if done.any():
+                finished = env_ids[done]
+                steps[finished] = time_step
+                rewards[finished] = total_reward[done]
+                is_won[finished] = won[done]
+                is_caught[finished] = caught[done]
+                running = ~done
+                env_ids = env_ids[running]
+                agent_cell_id = agent_cell_id[running]
+                state_space_index = state_space_index[running]
+                breadcrumb_cnt = breadcrumb_cnt[running]
+                total_reward = total_reward[running]
+                ghost_cell_ids = ghost_cell_ids[:, running]
+
+
+def summarise(results):
+    no_episodes = len(results["steps"])
+    won = results["won"]
+    caught = results["caught"]
+    return {
+        "no_episodes": no_episodes,
+        "win_rate": won.mean(),
+        "ghost_death_rate": caught.mean(),
+        "timeout_rate": (~won & ~caught).mean(),
+        "mean_reward": results["reward"].mean(),
+        # Steps to eat every breadcrumb, over the episodes won
+        "mean_steps_to_clear": results["steps"][won].mean() if won.any() else float("nan")}
+
+
+def print_summary(summary, epsilon):
+    print(f"Evaluation of {summary['no_episodes']} episodes with epsilon = {epsilon}: "
+          f"win rate {summary['win_rate'] * 100:.1f}%, ghost death rate {summary['ghost_death_rate'] * 100:.1f}%, "
+          f"timeouts {summary['timeout_rate'] * 100:.1f}%, mean steps to clear {summary['mean_steps_to_clear']:.1f}, "
+          f"mean reward {summary['mean_reward']:.1f}")
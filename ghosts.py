@@ -0,0 +1,158 @@
+import numpy as np
+from layouts import get_cached_arrays
+
+# The ghosts of a Pacman_grid with config.is_ghost, one for each mode in config.ghost_modes:
+#
+#   "random"    moves to one of the cells next to it at random, obstacles included, starting
+#               from a random border cell (the original ghost)
+#   "chase"     walks the free cells towards the agent
+#   "scatter"   walks the free cells towards its corner of the grid, the k-th scatter ghost
+#               to corner k % 4 (top left, top right, bottom left, bottom right)
+#
+# A chase or scatter ghost starts on a random free cell at least half of the longest shortest
+# path away from the start of the agent. On each move it takes the next cell of a shortest path
+# to its target with probability config.ghost_greedy, otherwise one of the free cells next to
+# it at random. Every ghost draws one uniform from the ghost stream per move, in the order of
+# ghost_modes, which decides both, so Batch_grid with B = 1 moves the ghosts as Pacman_grid does.
+# As with the random ghost, the agent is caught when it ends its move on the cell of a ghost.
+#
+# The shortest paths between the free cells are worked out once per layout, by a breadth first
+# search from every free cell at once, a level at a time, into
+#   distances[a, b]     the number of moves from a to b, or -1 if b cannot be reached from a
+#   next_cells[a, b]    the cell after a on a shortest path to b, or a itself if b is a or
+#                       cannot be reached
+# so a move is a lookup, rather than a search per step. They are cached in config.layout_cache
+# (see layouts.get_cached_arrays) under the hash of the moves between the free cells, so every
+# grid with the same obstacles reads the same tables.
+
+GHOST_MODES = ["random", "chase", "scatter"]
+# Part of the hash of the cached shortest paths, change it when the search changes
+PATHS_VERSION = 1
+
+
+def get_walk_moves(neighbour_cells, is_obstacle):
+    # walk_moves[cell, :walk_no_moves[cell]] are the free cells next to a free cell.
+    # A cell with none, or an obstacle, has the one move of staying where it is.
+    no_cells = len(is_obstacle)
+    walk_moves = np.repeat(np.arange(no_cells, dtype=np.int64)[:, None], 4, axis=1)
+    walk_no_moves = np.ones(no_cells, dtype=np.int64)
+    for cell_id in np.flatnonzero(~is_obstacle).tolist():
+        moves = [next_cell_id for next_cell_id in neighbour_cells[cell_id].tolist() if next_cell_id >= 0 and not is_obstacle[next_cell_id]]
+        if moves:
+            walk_moves[cell_id, :len(moves)] = moves
+            walk_no_moves[cell_id] = len(moves)
+    return walk_moves, walk_no_moves
+
+
+def search_shortest_paths(walk_moves, walk_no_moves, is_obstacle):
+    no_cells = len(is_obstacle)
+    distances = np.full((no_cells, no_cells), -1, dtype=np.int32)
+    next_cells = np.repeat(np.arange(no_cells, dtype=np.int32)[:, None], no_cells, axis=1)
+    # The frontier of every search, as (source, cell reached, first cell after the source)
+    sources = np.flatnonzero(~is_obstacle)
+    distances[sources, sources] = 0
+    cells = sources
+    first_cells = sources
+    distance = 0
+    while len(sources) > 0:
+        distance += 1
+        moves = []
+        for move in range(4):
+            is_move = move < walk_no_moves[cells]
+            new_cells = walk_moves[cells[is_move], move]
+            moves.append((sources[is_move], new_cells, new_cells if distance == 1 else first_cells[is_move]))
+        sources, cells, first_cells = (np.concatenate(arrays) for arrays in zip(*moves))
+        is_new = distances[sources, cells] < 0
+        sources, cells, first_cells = sources[is_new], cells[is_new], first_cells[is_new]
+        # A cell reached from several cells of the frontier keeps the first of them
+        _, first = np.unique(sources * no_cells + cells, return_index=True)
+        sources, cells, first_cells = sources[first], cells[first], first_cells[first]
+        distances[sources, cells] = distance
+        next_cells[sources, cells] = first_cells
+    return distances, next_cells
+
+
+def get_shortest_paths(walk_moves, walk_no_moves, is_obstacle, config):
+    def compute():
+        distances, next_cells = search_shortest_paths(walk_moves, walk_no_moves, is_obstacle)
+        return {"distances": distances, "next_cells": next_cells}
+    paths = get_cached_arrays(config, "ghost_paths", [str(PATHS_VERSION), walk_moves, walk_no_moves, is_obstacle], compute)
+    return paths["distances"], paths["next_cells"]
+
+
+class Ghosts:
+    def __init__(self, tables, config):
+        for mode in config.ghost_modes:
+            if mode not in GHOST_MODES:
+                raise ValueError(f"Unknown ghost mode {mode}, expected one of {', '.join(GHOST_MODES)}")
+        if len(config.ghost_modes) == 0:
+            raise ValueError("Hyper.ghost_modes is empty, set Hyper.is_ghost = False for no ghost")
+        self.tables = tables
+        self.modes = list(config.ghost_modes)
+        self.no_ghosts = len(self.modes)
+        self.is_walking = [mode != "random" for mode in self.modes]
+        self.greedy = config.ghost_greedy
+        # Scales the part of a uniform above ghost_greedy to the random moves
+        self.random_scale = 1 / (1 - self.greedy) if self.greedy < 1 else 0.0
+        # target_cell_ids[ghost] is the corner of a scatter ghost, or -1 to chase the agent
+        self.target_cell_ids = [-1] * self.no_ghosts
+        if not any(self.is_walking):
+            return
+        self.walk_moves, self.walk_no_moves = get_walk_moves(tables.neighbour_cells, tables.is_obstacle)
+        self.distances, self.next_cells = get_shortest_paths(self.walk_moves, self.walk_no_moves, tables.is_obstacle, config)
+        start_distances = self.distances[tables.start_cell_id]
+        if start_distances.max() < 1:
+            raise ValueError("There is no free cell for the chase and scatter ghosts to start on")
+        self.start_cell_ids = np.flatnonzero(start_distances >= (start_distances.max() + 1) // 2)
+        # The corner target of a scatter ghost is the reachable cell nearest to the corner
+        reachable_cell_ids = np.flatnonzero(start_distances >= 0)
+        rows, cols = np.divmod(reachable_cell_ids, config.N)
+        corners = [(0, 0), (0, config.N - 1), (config.N - 1, 0), (config.N - 1, config.N - 1)]
+        corner_cell_ids = [int(reachable_cell_ids[np.argmin(np.abs(rows - i) + np.abs(cols - j))]) for i, j in corners]
+        no_scatter = 0
+        for ghost, mode in enumerate(self.modes):
+            if mode == "scatter":
+                self.target_cell_ids[ghost] = corner_cell_ids[no_scatter % 4]
+                no_scatter += 1
+        # The rows used on every move of the Pacman_grid, as lists
+        self.walk_moves_list = self.walk_moves.tolist()
+        self.walk_no_moves_list = self.walk_no_moves.tolist()
+
+    def get_start_cell_ids(self, ghost):
+        return self.start_cell_ids if self.is_walking[ghost] else self.tables.border_cell_ids
+
+    def get_start_cells(self, ghost, uniforms):
+        # The start cells of the ghost, one for each uniform
+        start_cell_ids = self.get_start_cell_ids(ghost)
+        return start_cell_ids[(uniforms * len(start_cell_ids)).astype(np.int64)]
+
+    def move(self, ghost, ghost_cell_ids, agent_cell_ids, uniforms):
+        # The next cells of the ghost, for arrays of its cells, the cells of the agent and uniforms
+        tables = self.tables
+        if not self.is_walking[ghost]:
+            idx = (uniforms * tables.ghost_no_moves[ghost_cell_ids]).astype(np.int64)
+            return tables.ghost_moves[ghost_cell_ids, idx]
+        target_cell_id = self.target_cell_ids[ghost]
+        target_cell_ids = agent_cell_ids if target_cell_id < 0 else target_cell_id
+        no_moves = self.walk_no_moves[ghost_cell_ids]
+        idx = np.clip(((uniforms - self.greedy) * self.random_scale * no_moves).astype(np.int64), 0, no_moves - 1)
+        return np.where(uniforms < self.greedy, self.next_cells[ghost_cell_ids, target_cell_ids], self.walk_moves[ghost_cell_ids, idx])
+
+    def move_walking(self, ghost, ghost_cell_id, agent_cell_id, uniform):
+        # As move, for one chase or scatter ghost of a Pacman_grid
+        if uniform < self.greedy:
+            target_cell_id = self.target_cell_ids[ghost]
+            return int(self.next_cells[ghost_cell_id, agent_cell_id if target_cell_id < 0 else target_cell_id])
+        no_moves = self.walk_no_moves_list[ghost_cell_id]
+        return self.walk_moves_list[ghost_cell_id][min(int((uniform - self.greedy) * self.random_scale * no_moves), no_moves - 1)]
+
+
+def get_ghost_actions(neighbour_cells, ghost_cell_ids):
+    # For rows of the cells next to the agent and the (ghosts, rows) cells of the ghosts,
+    # the mask of the moves onto a ghost, which are replaced by the ghost action, and the
+    # cell the ghost action moves to, the first ghost next to the agent
+    if len(ghost_cell_ids) == 1:
+        return neighbour_cells == ghost_cell_ids[0][:, None], ghost_cell_ids[0]
+    is_next = neighbour_cells[None, :, :] == ghost_cell_ids[:, :, None]
+    first = np.argmax(is_next.any(axis=2), axis=0)
+    return is_next.any(axis=0), ghost_cell_ids[first, np.arange(ghost_cell_ids.shape[1])]
@@ -1,47 +1,63 @@
+import os
 import numpy as np
-import random
-import matplotlib.pyplot as plt
-import seaborn as sn
-import sys
 from policy import Policy
 from collections import namedtuple
-from config import Hyper, Constants
+from config import Constants, get_config
 from q_learn import Q_learn
+from grid_tables import Grid_tables
+from ghosts import Ghosts
+from metrics import Episode_metrics
+from random_streams import Random_streams
+from layouts import get_layout
+from replay_buffer import Replay_buffer
+from run_log import Episode_log
 
 
 class Pacman_grid:
-    def __init__(self):
-        self.no_cells = Hyper.N * Hyper.N
-        #self.results = np.zeros((2, int(Hyper.total_episodes / 100) + 1), dtype=np.int16)
-        self.results = np.zeros((2, Hyper.total_episodes), dtype=np.int16)
+    def __init__(self, seed=None, config=None):
+        # The settings of the run, taken from Hyper by default (see get_config)
+        self.config = get_config() if config is None else config
+        self.no_cells = self.config.N * self.config.N
         self.no_episodes = 0
+        # The rows of a Batch_grid still running when the checkpoint loaded into this grid
+        # was saved, which Batch_grid.run carries on with (see checkpoint.py)
+        self.batch_rows = None
+        # The random number streams of this grid, seeded from config.seed by default
+        self.rng = Random_streams(self.config.seed if seed is None else seed, self.config.rng_block_size)
         self.setup_display_dict()
         self.setup_env()
         self.setup_reward_dict()
         self.setup_action_dict()
-        self.Q = Q_learn(self.no_actions)
-        self.policy = Policy()
-        self.timesteps_per_episode = []
-        self.rewards_per_episode = []
+        self.setup_tables()
+        self.Q = Q_learn(self.no_actions, self.rng, self.config)
+        self.policy = Policy(self.rng, self.config)
+        # The past steps replayed into the Q table, with config.replay (see replay_buffer.py)
+        self.replay = Replay_buffer(self.rng.replay, self.config) if self.config.replay else None
+        # The statistics of each episode, streamed to config.metrics_path if there is one
+        self.metrics = Episode_metrics(self.config)
+        # The episode results, summarised at most once per config.log_interval_seconds (see run_log.py)
+        self.episode_log = Episode_log(self.config)
 
     def setup_env(self):
-        self.state_position_dict = {(i * Hyper.N + j):(i, j) for i in range(Hyper.N) for j in range(Hyper.N)}
+        self.state_position_dict = {(i * self.config.N + j):(i, j) for i in range(self.config.N) for j in range(self.config.N)}
         self.position_state_dict = {v: k for k, v in self.state_position_dict.items()}
-        self.env = np.zeros((Hyper.N, Hyper.N), dtype = np.int8)
-        self.env_counter = np.zeros((Hyper.N, Hyper.N), dtype = np.int16)
+        self.env = np.zeros((self.config.N, self.config.N), dtype = np.int8)
+        self.env_counter = np.zeros((self.config.N, self.config.N), dtype = np.int16)
         # Borders are obstacles
         self.env[0, :] = self.env[-1, :] = self.env[:, 0] = self.env[:, -1] = Constants.OBSTACLE
         arr_temp = np.nonzero(self.env == Constants.OBSTACLE)
         self.border_cells_coords = [(arr_temp[0][i], arr_temp[1][i]) for i in range(len(arr_temp[0]))]
         self.env_dict = {i:[] for i in range(self.no_cells)}
         low_lim = -1
-        high_lim = Hyper.N
+        high_lim = self.config.N
         for cell_id in range(self.no_cells):
             if cell_id > high_lim - 1:
-                low_lim += Hyper.N
-                high_lim += Hyper.N
+                low_lim += self.config.N
+                high_lim += self.config.N
             actions = self.get_actions_for_cell_id(cell_id, low_lim, high_lim)
             self.env_dict[cell_id].append(np.array(actions))
+        # The obstacle and breadcrumb cells, from config.layout (see layouts.py)
+        self.obstacle_cell_ids, self.breadcrumb_cell_ids = get_layout(self.env_dict, self.config)
         # Start cell in the middle
 
         _, i, j = self.get_start_cell_coords()
@@ -54,14 +70,36 @@ class Pacman_grid:
         self.populate_env_with_breadcrumbs()
         self.orig_env = np.copy(self.env)
 
+    def setup_tables(self):
+        # The step logic works on flat cell ids and a bitmask of the breadcrumbs eaten,
+        # using lookup tables built once from the grid layout.
+        # The rows used on every step are kept as lists, which are quicker to index one
+        # item at a time than NumPy arrays.
+        self.tables = Grid_tables(self)
+        self.neighbour_cells = self.tables.neighbour_cells.tolist()
+        self.move_cells = self.tables.move_cells.tolist()
+        self.ghost_moves = self.tables.ghost_moves.tolist()
+        self.ghost_no_moves = self.tables.ghost_no_moves.tolist()
+        self.is_obstacle = self.tables.is_obstacle.tolist()
+        self.breadcrumb_ids = self.tables.breadcrumb_ids.tolist()
+        self.breadcrumb_bits = self.tables.breadcrumb_bits.tolist()
+        self.cell_rewards = self.tables.cell_rewards.tolist()
+        self.border_cell_ids = self.tables.border_cell_ids.tolist()
+        # The ghosts of config.ghost_modes (see ghosts.py) and the cells each can start on
+        self.ghosts = Ghosts(self.tables, self.config) if self.config.is_ghost else None
+        if self.ghosts is not None:
+            self.ghost_start_cell_ids = [self.ghosts.get_start_cell_ids(ghost).tolist() for ghost in range(self.ghosts.no_ghosts)]
+        # A flat view of env_counter to count the steps per cell id
+        self.cell_counter = self.env_counter.reshape(-1)
+
     def get_actions_for_cell_id(self, cell_id, low_lim, high_lim):
         # These actions are to enable the ghost to move around the grid
         # from one cell to the next
         actions = []
-        up = cell_id - Hyper.N
+        up = cell_id - self.config.N
         if up > 0:
             actions.append(up)
-        down = cell_id + Hyper.N
+        down = cell_id + self.config.N
         if down < self.no_cells:
             actions.append(down)
         left = cell_id - 1
@@ -77,7 +115,7 @@ class Pacman_grid:
         # selecting obstacles in random locations risks the possibility of
         # insoluble games with a breadcrumb inaccessible surrounded by obstacles.
         # To rectify this, obstacles are set from a list of coordinates
-        for cell_id in Constants.OBSTACLE_CELL_IDS:
+        for cell_id in self.obstacle_cell_ids:
             coord = self.state_position_dict[cell_id]
             self.env[coord[0], coord[1]] = Constants.OBSTACLE
 
@@ -86,9 +124,9 @@ class Pacman_grid:
         # insoluble games with a breadcrumb inaccessible surrounded by obstacles.
         # To rectify this, obstacles are set from a list of coordinates
         no_breadcrumbs = 0
-        for cell_id in Constants.BREADCRUMB_CELL_IDS:
+        for cell_id in self.breadcrumb_cell_ids:
             no_breadcrumbs += 1
-            if no_breadcrumbs > Hyper.no_breadcrumbs:
+            if no_breadcrumbs > self.config.no_breadcrumbs:
                 break   
             coord = self.state_position_dict[cell_id]
             self.env[coord[0], coord[1]] = Constants.BREADCRUMB
@@ -100,7 +138,7 @@ class Pacman_grid:
     def populate_env_with_random_breadcrumbs(self):
         # Keep a record of the breadcrumb coordinates
         # This can be used to calculate the index of the Q table
-        self.populate_env_with_state(Constants.BREADCRUMB, Hyper.no_breadcrumbs)
+        self.populate_env_with_state(Constants.BREADCRUMB, self.config.no_breadcrumbs)
         arr_temp = np.nonzero(self.env == Constants.BREADCRUMB)
         self.id_breadcrumb_coords = {i : (arr_temp[0][i], arr_temp[1][i]) for i in range(len(arr_temp[0]))}
         self.breadcrumb_coords_id = {v: k for k, v in self.id_breadcrumb_coords.items()} 
@@ -116,7 +154,7 @@ class Pacman_grid:
 
     def get_empty_cells(self, n_cells):
         empty_cells_coord = np.where( self.env == Constants.EMPTY)
-        selected_indices = np.random.choice( np.arange(len(empty_cells_coord[0])), n_cells )
+        selected_indices = self.rng.layout.choice( np.arange(len(empty_cells_coord[0])), n_cells )
         selected_coordinates = empty_cells_coord[0][selected_indices], empty_cells_coord[1][selected_indices]
         
         if n_cells == 1:
@@ -146,7 +184,7 @@ class Pacman_grid:
         left = _Action('left', Constants.LEFT, 0, -1)    
         right = _Action('right', Constants.RIGHT, 0, 1)
         self.index_to_actions = {} 
-        if Hyper.is_ghost:
+        if self.config.is_ghost:
             ghost = _Action('ghost', Constants.GHOST, 0, 0)
             for action in [up, down, left, right, ghost]:
                 self.index_to_actions[action.index] = action
@@ -167,70 +205,55 @@ class Pacman_grid:
     def reset(self):
         # reset the breadcrumb indexes on the Q matrix
         self.Q.reset()
-        # set the grid to how it was before
-        self.env = np.copy(self.orig_env)
         # put agent in the start cell of the environment
-        start_cell_id, i, j = self.get_start_cell_coords()
-        self.env[i, j] = Constants.AGENT
+        start_cell_id, _, _ = self.get_start_cell_coords()
         self.agent_cell_id = start_cell_id
         self.time_step = 0
         self.total_reward_per_episode = 0
         self.done = False
         self.breadcrumb_cnt = 0
-        self.prev_state = Constants.START
-        """ if self.no_episodes > 0 and self.no_episodes % 100 == 0:
-            self.result_index += 1 """
+        self.is_won = False
+        self.is_caught = False
+        # Bitmask of the breadcrumbs eaten, with the bit of each breadcrumb id set when eaten.
+        # All of the breadcrumb cells are back to their original state.
+        self.breadcrumbs_eaten = 0
         self.no_episodes += 1
 
-        if Hyper.is_ghost:
+        # The cell of each ghost, with no ghost there are none
+        self.ghost_cell_ids = []
+        if self.config.is_ghost:
             self.set_ghost()
 
     def set_ghost(self):
-        # Choose a random start location for the ghost on the border cells
-        idx = random.randint(0, len(self.border_cells_coords) - 1)
-        self.ghost_cell_coords = self.border_cells_coords[idx]
-        self.ghost_cell_id = self.position_state_dict[self.ghost_cell_coords[0], self.ghost_cell_coords[1]]
-        self.prev_ghost_cell_id = self.ghost_cell_id
-        self.prev_ghost_cell_state = Constants.OBSTACLE
-        self.env[self.ghost_cell_coords[0], self.ghost_cell_coords[1]] = Constants.GHOST
+        # Choose a random start location for each ghost, on the border cells for a random
+        # ghost and away from the start of the agent for a chase or scatter one
+        self.ghost_cell_ids = []
+        for start_cell_ids in self.ghost_start_cell_ids:
+            idx = int(self.rng.ghost.random() * len(start_cell_ids))
+            self.ghost_cell_ids.append(start_cell_ids[idx])
 
     def move_ghost(self):
-        (i, j) = self.state_position_dict[self.ghost_cell_id]
-        self.env[i, j] = self.prev_ghost_cell_state
-        temp = self.env_dict[self.ghost_cell_id]
-        self.ghost_cell_id = np.random.choice(temp[0])
-        (i, j) = self.state_position_dict[self.ghost_cell_id]
-        if self.env[i, j] == Constants.AGENT:
-            self.prev_ghost_cell_state = self.prev_state
-        else:
-            self.prev_ghost_cell_state = self.env[i, j]
-        self.env[i, j] = Constants.GHOST
+        # Each ghost moves in turn, with one uniform from the ghost stream
+        for ghost, is_walking in enumerate(self.ghosts.is_walking):
+            ghost_cell_id = self.ghost_cell_ids[ghost]
+            uniform = self.rng.ghost.random()
+            if is_walking:
+                self.ghost_cell_ids[ghost] = self.ghosts.move_walking(ghost, ghost_cell_id, self.agent_cell_id, uniform)
+            else:
+                # The ghost moves to one of the cells next to it at random
+                self.ghost_cell_ids[ghost] = self.ghost_moves[ghost_cell_id][int(uniform * self.ghost_no_moves[ghost_cell_id])]
 
     def get_available_actions_including_ghost(self):
         # Check if an up, down, left, right action needs to be replaced by a ghost action
-        available_actions = []
-        agent_coords = self.state_position_dict[self.agent_cell_id]
-        ghost_coords = self.state_position_dict[self.ghost_cell_id]
-        action = self.get_action_for_state(Constants.UP, agent_coords, ghost_coords)
-        available_actions.append(action)
-        action = self.get_action_for_state(Constants.DOWN, agent_coords, ghost_coords)
-        available_actions.append(action)
-        action = self.get_action_for_state(Constants.LEFT, agent_coords, ghost_coords)
-        available_actions.append(action)
-        action = self.get_action_for_state(Constants.RIGHT, agent_coords, ghost_coords)
-        available_actions.append(action)
+        available_actions = [Constants.UP, Constants.DOWN, Constants.LEFT, Constants.RIGHT]
+        neighbour_cells = self.neighbour_cells[self.agent_cell_id]
+        for action in range(4):
+            if neighbour_cells[action] in self.ghost_cell_ids:
+                # If the action moves onto a cell containing the ghost,
+                # replace the previous action with the ghost action
+                available_actions[action] = Constants.GHOST
         return available_actions
 
-    def get_action_for_state(self, action, agent_coords, ghost_coords):
-        coord = np.zeros(2)
-        coord[0] = agent_coords[0] + self.index_to_actions[action].delta_i
-        coord[1] = agent_coords[1] + self.index_to_actions[action].delta_j
-        if ghost_coords[0] == coord[0] and ghost_coords[1] == coord[1]:
-            # If the action moves onto a cell containing the ghost,
-            # replace the previous action with the ghost action
-            action = Constants.GHOST    
-        return action
-
 
     def step(self, episode):
         self.time_step += 1
@@ -240,21 +263,21 @@ class Pacman_grid:
         reward = self.get_reward(new_cell_id)
         self.total_reward_per_episode += reward
         self.Q.update(self.agent_cell_id, new_cell_id, action, reward)
+        old_cell_id = self.agent_cell_id
+        old_index = self.Q.state_space_index
         self.agent_step(new_cell_id)
-        if Hyper.show_step:
+        if self.replay is not None:
+            self.remember(old_cell_id, old_index, action, reward)
+        if self.config.show_step:
             self.print_curr_grid(f"Environment for step {self.time_step}")
    
         if self.time_step > 1000:
-            print("Too many timesteps")
-            #self.results[Constants.LOSE_CELL, self.result_index] += 1
-            self.results[Constants.LOSE_CELL, episode] += 1
+            self.episode_log.logger.warning("Too many timesteps")
             self.done = True
             return self.done
 
-        self.done = self.breadcrumb_cnt == Hyper.no_breadcrumbs
-        if self.done:
-            #self.results[Constants.WIN_CELL, self.result_index] += 1
-            self.results[Constants.WIN_CELL, episode] += 1
+        self.done = self.breadcrumb_cnt == self.config.no_breadcrumbs
+        self.is_won = self.done
 
         return self.done
 
@@ -268,209 +291,140 @@ class Pacman_grid:
         reward = self.get_reward(new_cell_id)
         self.total_reward_per_episode += reward
         self.Q.update(self.agent_cell_id, new_cell_id, action, reward)
+        old_cell_id = self.agent_cell_id
+        old_index = self.Q.state_space_index
         self.agent_step(new_cell_id)
-        if Hyper.show_step:
+        if self.replay is not None:
+            self.remember(old_cell_id, old_index, action, reward)
+        if self.config.show_step:
             self.print_curr_grid(f"Environment for step {self.time_step}")
    
-        if Hyper.is_ghost and self.ghost_cell_id == self.agent_cell_id:
-            if Hyper.print_episodes:
-                print("You lost to the ghost!")
-            self.results[Constants.LOSE_CELL, episode] += 1
+        if self.agent_cell_id in self.ghost_cell_ids:
+            if self.config.print_episodes:
+                self.episode_log.logger.debug("You lost to the ghost!")
+            self.is_caught = True
             self.done = True
             return self.done
 
         if self.time_step > 5000:
             # This is a safeguard check, it shouldn't happen.
             # It does prevent a possible infinite loop.
-            print("Too many timesteps")
-            self.results[Constants.LOSE_CELL, episode] += 1
+            self.episode_log.logger.warning("Too many timesteps")
             self.done = True
             return self.done
 
-        self.done = self.breadcrumb_cnt == Hyper.no_breadcrumbs
-        if self.done:
-            self.results[Constants.WIN_CELL, episode] += 1
+        self.done = self.breadcrumb_cnt == self.config.no_breadcrumbs
+        self.is_won = self.done
 
         return self.done
 
+    def remember(self, old_cell_id, old_index, action, reward):
+        # Store the step in the replay buffer and replay the minibatches it is owed.
+        # The step is done when it ends the episode with the ghost or the last breadcrumb.
+        done = self.agent_cell_id in self.ghost_cell_ids or self.breadcrumb_cnt == self.config.no_breadcrumbs
+        self.replay.add(old_cell_id, old_index, action, reward, self.agent_cell_id, self.Q.state_space_index, done)
+        self.replay.replay(self.Q.Q_table)
+
     def check_if_cell_breadcrumb(self, cell_id):
-        i, j = self.state_position_dict[cell_id]
-        state = self.env[i, j]
-        is_breadcrumb = state == Constants.BREADCRUMB
+        # A breadcrumb cell stays a breadcrumb until the agent has eaten it
+        breadcrumb_bit = self.breadcrumb_bits[cell_id]
+        is_breadcrumb = breadcrumb_bit != 0 and self.breadcrumbs_eaten & breadcrumb_bit == 0
         return is_breadcrumb
 
     def get_reward(self, cell_id):
-        i, j = self.state_position_dict[cell_id]
-        state = self.env[i, j]
-        reward = self.reward_dict[state]
+        if cell_id in self.ghost_cell_ids:
+            return Constants.GHOST_REWARD
+        if self.check_if_cell_breadcrumb(cell_id):
+            return Constants.BREADCRUMB_REWARD
+        reward = self.cell_rewards[cell_id]
         return reward
 
     def agent_step(self, new_cell_id):
         # check if the new cell location is on an obstacle
-        # if it is, do not change the environment or move the agent
-        i, j = self.state_position_dict[new_cell_id]
-        if self.env[i, j] == Constants.OBSTACLE:
+        # if it is, do not change the environment or move the agent.
+        # A random ghost can be on an obstacle, and the agent moves onto it.
+        if self.is_obstacle[new_cell_id] and new_cell_id not in self.ghost_cell_ids:
             return
 
-        # When the Pacman agent moves from the start cell, 
-        # that cell will be empty
-        i, j = self.state_position_dict[self.agent_cell_id]
-        if self.prev_state == Constants.BREADCRUMB:
+        if self.check_if_cell_breadcrumb(self.agent_cell_id):
             # When the Pacman agent leaves the breadcrumb cell, 
             # it will change state to empty in the grid
             # and become empty in the Q table
-            breadcrumb_id = self.breadcrumb_coords_id[i, j]
+            breadcrumb_id = self.breadcrumb_ids[self.agent_cell_id]
             self.Q.update_Q_table_index(breadcrumb_id)
+            self.breadcrumbs_eaten |= self.breadcrumb_bits[self.agent_cell_id]
             self.breadcrumb_cnt += 1 
 
-        # The Pacman agent leaves the current cell, which will be then always be empty
-        self.env[i, j] = Constants.EMPTY
-        
         self.agent_cell_id = new_cell_id
-        i, j = self.state_position_dict[self.agent_cell_id]
-        self.prev_state = self.env[i, j]
-        self.env[i, j] = Constants.AGENT
         # increment the number of steps counter for the current cell.
-        self.env_counter[i, j] += 1
+        self.cell_counter[new_cell_id] += 1
 
     def get_cell_id_for_action(self, action):
-        # to move the agent, get the coordinates of the current cell
-        # change one of the coordinates, and return the cell_id of the new cell
-        _action = self.index_to_actions[action]
-        if _action.index == Constants.GHOST:
-            new_cell_id = self.ghost_cell_id
-            return new_cell_id
-
-        i, j = self.state_position_dict[self.agent_cell_id]
-        i += _action.delta_i
-        j += _action.delta_j
-        new_cell_id = self.position_state_dict[i, j]
+        # to move the agent, look up the cell the action moves to
+        if action == Constants.GHOST:
+            # The first ghost on a cell next to the agent
+            neighbour_cells = self.neighbour_cells[self.agent_cell_id]
+            for ghost_cell_id in self.ghost_cell_ids:
+                if ghost_cell_id in neighbour_cells:
+                    return ghost_cell_id
+
+        new_cell_id = self.move_cells[self.agent_cell_id][action]
         return new_cell_id
 
+    def get_curr_env(self):
+        # Rebuild the grid of cell states for display
+        env = np.copy(self.orig_env)
+        if self.time_step > 0:
+            # The start cell is empty once the agent has left it
+            start_cell_id, i, j = self.get_start_cell_coords()
+            env[i, j] = Constants.EMPTY
+        for cell_id, breadcrumb_bit in enumerate(self.breadcrumb_bits):
+            if self.breadcrumbs_eaten & breadcrumb_bit:
+                env.flat[cell_id] = Constants.EMPTY
+        env.flat[self.agent_cell_id] = Constants.AGENT
+        for ghost_cell_id in self.ghost_cell_ids:
+            env.flat[ghost_cell_id] = Constants.GHOST
+        return env
+
     def print_orig_grid_to_txt(self, caption):
         # Print the original grid to the text file
-        env_filename = f"images/env_lr{Hyper.alpha}_discount_rate{Hyper.gamma}_bc{Hyper.no_breadcrumbs}".replace(".","") + ".txt"
-        if Hyper.is_ghost:
+        env_filename = f"images/env_lr{self.config.alpha}_discount_rate{self.config.gamma}_bc{self.config.no_breadcrumbs}".replace(".","") + ".txt"
+        if self.config.is_ghost:
             env_filename = env_filename.replace("images/", "images/ghost_")
-        sys.stdout = open(env_filename,'wt')
-        self.print_grid(caption, self.orig_env)
+        os.makedirs(os.path.dirname(env_filename), exist_ok=True)
+        with open(env_filename, "wt") as env_file:
+            env_file.write("\n".join(self.get_grid_lines(caption, self.orig_env)) + "\n")
 
     def print_curr_grid(self, caption):
-        # Print the latest grid for diagnostic purposes
-        self.print_grid(caption, self.env)
+        # Log the latest grid for diagnostic purposes
+        self.episode_log.logger.info("\n".join(self.get_grid_lines(caption, self.get_curr_env())))
 
-    def print_grid(self, caption, env):
+    def get_grid_lines(self, caption, env):
         # Use characters rather than integers to make it easier to interpret the grid
-        print(caption)
+        lines = [caption]
         lower = 0
-        higher = Hyper.N - 1
-        for i in range(Hyper.N):
+        higher = self.config.N - 1
+        for i in range(self.config.N):
             line = ''
-            for j in range(Hyper.N):
+            for j in range(self.config.N):
                 state_id = env[i,j]
                 line += self.dict_map_display[state_id] + " "
             line += f"    cells {lower} - {higher}"
-            print(line)
-            lower += Hyper.N
-            higher += Hyper.N
+            lines.append(line)
+            lower += self.config.N
+            higher += self.config.N
+        return lines
 
-    def print_episode_results(self, episodes):
-        caption = f"Completed environment after {episodes} episodes and {self.time_step} timesteps, total reward: {self.total_reward_per_episode} with epsilon: {self.policy.epsilon}"
-        print(caption)
+    def log_episode_results(self, episodes):
+        self.episode_log.add(episodes, self.time_step, self.total_reward_per_episode, self.policy.epsilon, self.is_won, self.is_caught)
 
     def save_episode_stats(self):
-        self.timesteps_per_episode.append(self.time_step)
-        self.rewards_per_episode.append(self.total_reward_per_episode)
+        self.metrics.add(self.time_step, self.total_reward_per_episode, self.is_won, self.policy.epsilon, self.is_caught)
 
     def print_results(self):
-        hm_filename = f"images/hm_lr{Hyper.alpha}_discount_rate{Hyper.gamma}_bc{Hyper.no_breadcrumbs}".replace(".","") + ".jpg"
-        rw_filename = f"images/rw_lr{Hyper.alpha}_discount_rate{Hyper.gamma}_bc{Hyper.no_breadcrumbs}".replace(".","") + ".jpg"
-        rw_ma_filename = f"images/rw_ma_lr{Hyper.alpha}_discount_rate{Hyper.gamma}_bc{Hyper.no_breadcrumbs}".replace(".","") + ".jpg"
-        ts_filename = f"images/ts_lr{Hyper.alpha}_discount_rate{Hyper.gamma}_bc{Hyper.no_breadcrumbs}".replace(".","") + ".jpg"
-        res_filename = f"images/res_lr{Hyper.alpha}_discount_rate{Hyper.gamma}_bc{Hyper.no_breadcrumbs}".replace(".","") + ".jpg"
-        if Hyper.is_ghost:
-            hm_filename = hm_filename.replace("images/", "images/ghost_")
-            rw_filename = rw_filename.replace("images/", "images/ghost_")
-            rw_ma_filename = rw_ma_filename.replace("images/", "images/ghost_")
-            ts_filename = ts_filename.replace("images/", "images/ghost_")
-            res_filename = res_filename.replace("images/", "images/ghost_")
+        # The figures are drawn by report.py, imported here so that only a run
+        # that draws them loads matplotlib and seaborn.
+        # Returns the process drawing them with config.report_in_background, otherwise None.
+        import report
         self.print_orig_grid_to_txt("Initial Environment")
-        x_label_text = f"Episode # (learning rate = {Hyper.alpha}, discount factor = {Hyper.gamma})"
-        _ = sn.heatmap(data=self.env_counter)
-        plt.title("Number of steps per cell")
-        plt.xlabel(x_label_text)
-        plt.savefig(hm_filename)
-
-        fig = plt.figure()
-        fig.add_subplot(111)
-        
-        episodes = np.arange(1, len(self.timesteps_per_episode)+1)
-        plt.title(f"Number of timesteps per episode for {Hyper.no_breadcrumbs} breadcrumbs")
-        plt.plot(episodes, self.timesteps_per_episode)
-        plt.ylabel('Steps')
-        plt.xlabel(x_label_text)
-        plt.savefig(ts_filename)
-
-        fig = plt.figure()
-        fig.add_subplot(111)
-        x_label_text = f"Episode # (learning rate = {Hyper.alpha}, discount factor = {Hyper.gamma})"
-        episodes = np.arange(1, len(self.rewards_per_episode)+1)
-        plt.title(f"Value of rewards per episode for {Hyper.no_breadcrumbs} breadcrumbs")
-        plt.plot(episodes, self.rewards_per_episode)
-        plt.ylabel('Rewards')
-        plt.xlabel(x_label_text)
-        plt.savefig(rw_filename)
-
-        self.moving_average_rewards = self.get_moving_average_rewards()
-        episodes = np.arange(Hyper.total_episodes)
-        fig = plt.figure()
-        fig.add_subplot(111)
-        x_label_text = f"Episode # (learning rate = {Hyper.alpha}, discount factor = {Hyper.gamma})"
-        plt.title(f"Moving Average rewards per hundred episodes")
-        plt.plot(episodes, self.moving_average_rewards, "b-")
-        plt.ylabel('Results per 100')
-        plt.xlabel(x_label_text)
-        plt.savefig(rw_ma_filename)
-
-        self.moving_average_results = self.get_moving_average_results()
-        episodes = np.arange(Hyper.total_episodes)
-        fig = plt.figure()
-        fig.add_subplot(111)
-        x_label_text = f"Episode # (learning rate = {Hyper.alpha}, discount factor = {Hyper.gamma})"
-        plt.title(f"Moving Average per hundred episodes % wins/losses: Wins in blue, losses in red")
-        plt.plot(episodes, self.moving_average_results[Constants.WIN_CELL], "b-", episodes, self.moving_average_results[Constants.LOSE_CELL], "r-")
-        plt.ylabel('Results per 100')
-        plt.xlabel(x_label_text)
-        plt.savefig(res_filename)
-
-    def get_moving_average_rewards(self):
-        moving_average_rewards = np.zeros((Hyper.total_episodes), dtype=np.float)
-        limit = 100
-        for i in range(self.no_episodes):
-            episodes = i + 1
-            if i < limit:
-                reward_total = sum(self.rewards_per_episode[0:episodes])
-                moving_average_rewards[i] = reward_total / episodes
-            else:
-                reward_total = sum(self.rewards_per_episode[(episodes - limit):i])
-                moving_average_rewards[i] = reward_total / limit
-        return moving_average_rewards
-
-    def get_moving_average_results(self):
-        moving_average_results = np.zeros((2, Hyper.total_episodes), dtype=np.float)
-        limit = 100
-        for i in range(self.no_episodes):
-            episodes = i + 1
-            if i < limit:
-                win_total = sum(self.results[Constants.WIN_CELL, 0:episodes])
-                lose_total = sum(self.results[Constants.LOSE_CELL, 0:episodes])
-                moving_average_results[Constants.WIN_CELL, i] = win_total / episodes * 100
-                moving_average_results[Constants.LOSE_CELL, i] = lose_total / episodes * 100
-            else:
-                win_total = sum(self.results[Constants.WIN_CELL, (episodes - limit):i])
-                lose_total = sum(self.results[Constants.LOSE_CELL, (episodes - limit):i])
-                moving_average_results[Constants.WIN_CELL, i] = win_total / limit * 100
-                moving_average_results[Constants.LOSE_CELL, i] = lose_total / limit * 100 
-        return moving_average_results
-
-
+        return report.print_results(self)
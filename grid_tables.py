@@ -0,0 +1,48 @@
+import numpy as np
+from config import Constants
+
+
+class Grid_tables:
+    # Flatten everything the step logic of a Pacman_grid needs into lookup tables
+    # indexed by cell id. The obstacle layout is fixed once setup_env has run, so the
+    # tables are built once per grid and a step never goes through the coordinate
+    # dictionaries or the 2-D env array.
+    # The tables are plain integer arrays, which is what Batch_grid and the compiled
+    # episode kernel in jit_grid.py work on.
+    def __init__(self, grid):
+        self.no_cells = grid.no_cells
+        orig_env = grid.orig_env.reshape(-1)
+        self.start_cell_id, _, _ = grid.get_start_cell_coords()
+        # neighbour_cells[cell, action] is the cell reached by an up, down, left or right
+        # move, or -1 if it is outside the grid
+        self.neighbour_cells = np.full((self.no_cells, 4), -1, dtype=np.int64)
+        for cell_id, (i, j) in grid.state_position_dict.items():
+            for action in range(4):
+                _action = grid.index_to_actions[action]
+                position = (i + _action.delta_i, j + _action.delta_j)
+                if position in grid.position_state_dict:
+                    self.neighbour_cells[cell_id, action] = grid.position_state_dict[position]
+        # move_cells[cell, action] is the next cell of the agent, it stays put at the edge
+        cell_ids = np.arange(self.no_cells)[:, None]
+        self.move_cells = np.where(self.neighbour_cells < 0, cell_ids, self.neighbour_cells)
+        # The ghost moves to one of the cells in env_dict, padded to 4 columns
+        self.ghost_no_moves = np.zeros(self.no_cells, dtype=np.int64)
+        self.ghost_moves = np.zeros((self.no_cells, 4), dtype=np.int64)
+        for cell_id in range(self.no_cells):
+            moves = grid.env_dict[cell_id][0]
+            self.ghost_no_moves[cell_id] = len(moves)
+            self.ghost_moves[cell_id, :len(moves)] = moves
+        self.border_cell_ids = np.array([grid.position_state_dict[i, j] for (i, j) in grid.border_cells_coords], dtype=np.int64)
+        self.is_obstacle = orig_env == Constants.OBSTACLE
+        # breadcrumb_ids[cell] is the breadcrumb id of the cell, or -1, and breadcrumb_bits[cell]
+        # its bit in the state space index of the Q table
+        self.breadcrumb_ids = np.full(self.no_cells, -1, dtype=np.int64)
+        for (i, j), breadcrumb_id in grid.breadcrumb_coords_id.items():
+            self.breadcrumb_ids[grid.position_state_dict[i, j]] = breadcrumb_id
+        self.breadcrumb_bits = np.where(self.breadcrumb_ids < 0, 0, np.left_shift(1, np.maximum(self.breadcrumb_ids, 0)))
+        # The reward of a cell with no breadcrumb and no ghost on it
+        self.cell_rewards = np.where(self.is_obstacle, grid.reward_dict[Constants.OBSTACLE], grid.reward_dict[Constants.EMPTY])
+        self.breadcrumb_reward = grid.reward_dict[Constants.BREADCRUMB]
+        self.ghost_reward = grid.reward_dict[Constants.GHOST]
+        self.no_breadcrumbs = len(grid.breadcrumb_coords_id)
+        self.max_time_steps = 5000 if grid.config.is_ghost else 1000
@@ -0,0 +1,176 @@
+import numpy as np
+from config import Constants, get_config
+from checkpoint import save_checkpoint, is_checkpoint_due
+
+# The numba package is optional. Without it Jit_grid.is_available() is False
+# and main.py keeps to the Python loop.
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        def decorator(function):
+            return function
+        return decorator
+
+# Module level copy of the constant, numba reads globals as compile time constants
+GHOST = Constants.GHOST
+
+
+@njit(cache=True)
+def run_episode_block(seed, no_episodes, Q_table, alpha, gamma, epsilon, decay, epsilon_threshold,
+                      is_ghost, max_time_steps, no_breadcrumbs, start_cell_id, neighbour_cells,
+                      move_cells, ghost_moves, ghost_no_moves, border_cell_ids, is_obstacle,
+                      breadcrumb_bits, cell_rewards, breadcrumb_reward, ghost_reward,
+                      env_counter, timesteps, rewards, is_won, is_caught, epsilons):
+    # Run no_episodes episodes of Pacman_grid.step/ghost_step without leaving compiled code.
+    # The state is the agent and ghost cell ids and the bitmask of the breadcrumbs eaten,
+    # which is also the state space index into the dense Q table of Q_learn.
+    # The results of each episode are written to timesteps, rewards, is_won, is_caught and epsilons,
+    # the number of visits to each cell is added to env_counter and the new epsilon returned.
+    # The random numbers come from the numba random generator seeded with seed, not from the
+    # Random_streams of the Pacman_grid (see random_streams.py), so for a given seed the
+    # episodes differ from the ones of the Python loop and Batch_grid.
+    np.random.seed(seed)
+    available_actions = np.zeros(4, dtype=np.int64)
+    for episode in range(no_episodes):
+        agent_cell_id = start_cell_id
+        state_space_index = 0
+        breadcrumb_cnt = 0
+        time_step = 0
+        total_reward = 0
+        ghost_cell_id = -1
+        if is_ghost:
+            ghost_cell_id = border_cell_ids[int(np.random.random() * len(border_cell_ids))]
+        while True:
+            time_step += 1
+            if is_ghost:
+                ghost_cell_id = ghost_moves[ghost_cell_id, int(np.random.random() * ghost_no_moves[ghost_cell_id])]
+            for action in range(4):
+                available_actions[action] = action
+                if neighbour_cells[agent_cell_id, action] == ghost_cell_id:
+                    available_actions[action] = GHOST
+
+            # Epsilon greedy choice, ties for the maximum Q value are chosen at random
+            is_greedy = np.random.random() > epsilon
+            uniform = np.random.random()
+            action = available_actions[0]
+            if is_greedy:
+                q_max = Q_table[agent_cell_id, state_space_index, available_actions[0]]
+                no_max = 0
+                for idx in range(4):
+                    q_val = Q_table[agent_cell_id, state_space_index, available_actions[idx]]
+                    if q_val > q_max:
+                        q_max = q_val
+                        no_max = 1
+                    elif q_val == q_max:
+                        no_max += 1
+                nth_max = int(uniform * no_max)
+                for idx in range(4):
+                    if Q_table[agent_cell_id, state_space_index, available_actions[idx]] == q_max:
+                        if nth_max == 0:
+                            action = available_actions[idx]
+                            break
+                        nth_max -= 1
+            else:
+                action = available_actions[int(uniform * 4)]
+
+            if action == GHOST:
+                new_cell_id = ghost_cell_id
+            else:
+                new_cell_id = move_cells[agent_cell_id, action]
+            if new_cell_id == ghost_cell_id:
+                reward = ghost_reward
+            elif breadcrumb_bits[new_cell_id] != 0 and state_space_index & breadcrumb_bits[new_cell_id] == 0:
+                reward = breadcrumb_reward
+            else:
+                reward = cell_rewards[new_cell_id]
+            total_reward += reward
+
+            # Q_learn.update
+            q_old = Q_table[agent_cell_id, state_space_index, action]
+            q_max = Q_table[new_cell_id, state_space_index, 0]
+            for idx in range(1, Q_table.shape[2]):
+                q_max = max(q_max, Q_table[new_cell_id, state_space_index, idx])
+            Q_table[agent_cell_id, state_space_index, action] = q_old + alpha * (reward + gamma * q_max - q_old)
+
+            # Pacman_grid.agent_step
+            if not is_obstacle[new_cell_id] or new_cell_id == ghost_cell_id:
+                breadcrumb_bit = breadcrumb_bits[agent_cell_id]
+                if breadcrumb_bit != 0 and state_space_index & breadcrumb_bit == 0:
+                    state_space_index |= breadcrumb_bit
+                    breadcrumb_cnt += 1
+                agent_cell_id = new_cell_id
+                env_counter[agent_cell_id] += 1
+
+            if epsilon > epsilon_threshold:
+                epsilon *= decay
+
+            is_won[episode] = False
+            is_caught[episode] = False
+            if is_ghost and ghost_cell_id == agent_cell_id:
+                is_caught[episode] = True
+                break
+            if time_step > max_time_steps:
+                break
+            if breadcrumb_cnt == no_breadcrumbs:
+                is_won[episode] = True
+                break
+
+        timesteps[episode] = time_step
+        rewards[episode] = total_reward
+        epsilons[episode] = epsilon
+    return epsilon
+
+
+class Jit_grid:
+    # Runs the episodes of a Pacman_grid through the compiled kernel above in blocks of
+    # Hyper.jit_block_episodes. The Q table, policy epsilon and episode metrics are the
+    # ones of the Pacman_grid, so print_results works as before.
+    def __init__(self, pacman_grid):
+        self.grid = pacman_grid
+        self.tables = pacman_grid.tables
+
+    @staticmethod
+    def is_available(config=None):
+        # The kernel needs numba and works on the dense Q table array of floats numba supports.
+        # It has no replay buffer and only the one random ghost. config is the settings of the
+        # run, Hyper by default.
+        if config is None:
+            config = get_config()
+        is_random_ghost = not config.is_ghost or tuple(config.ghost_modes) == ("random",)
+        return HAS_NUMBA and config.q_table == "dense" and config.q_dtype in ("float64", "float32") and not config.replay and is_random_ghost
+
+    def run(self, total_episodes, first_episode=0):
+        # Run the episodes from first_episode up to total_episodes.
+        # A block stops at a checkpoint, so that a resumed run has the same blocks.
+        grid = self.grid
+        config = grid.config
+        tables = self.tables
+        while first_episode < total_episodes:
+            no_episodes = min(config.jit_block_episodes, total_episodes - first_episode)
+            if config.checkpoint_interval > 0:
+                no_episodes = min(no_episodes, config.checkpoint_interval - first_episode % config.checkpoint_interval)
+            timesteps = np.zeros(no_episodes, dtype=np.int64)
+            rewards = np.zeros(no_episodes, dtype=np.int64)
+            is_won = np.zeros(no_episodes, dtype=np.bool_)
+            is_caught = np.zeros(no_episodes, dtype=np.bool_)
+            epsilons = np.zeros(no_episodes, dtype=np.float64)
+            # Seed each block from the kernel stream of the grid so a run is reproducible from its seed
+            seed = int(grid.rng.kernel.integers(0, 2**31 - 1))
+            grid.policy.epsilon = run_episode_block(
+                seed, no_episodes, np.asarray(grid.Q.Q_table.values), config.alpha, config.gamma,
+                grid.policy.epsilon, config.decay, config.epsilon_threshold, config.is_ghost,
+                tables.max_time_steps, tables.no_breadcrumbs, tables.start_cell_id, tables.neighbour_cells,
+                tables.move_cells, tables.ghost_moves, tables.ghost_no_moves, tables.border_cell_ids,
+                tables.is_obstacle, tables.breadcrumb_bits, tables.cell_rewards, tables.breadcrumb_reward,
+                tables.ghost_reward, grid.cell_counter, timesteps, rewards, is_won, is_caught, epsilons)
+            grid.metrics.add_batch(timesteps, rewards, is_won, epsilons, is_caught)
+            if config.print_episodes:
+                grid.episode_log.add_batch(first_episode + no_episodes, timesteps, rewards, epsilons, is_won, is_caught)
+            first_episode += no_episodes
+            grid.no_episodes = first_episode
+            if is_checkpoint_due(first_episode, config):
+                save_checkpoint(grid, first_episode)
@@ -0,0 +1,161 @@
+import os
+import hashlib
+from collections import deque
+import numpy as np
+from config import Constants, get_config
+
+# Where the obstacles and breadcrumbs of a Pacman_grid go, chosen by config.layout (Hyper.layout by default):
+#
+#   "default"       Constants.OBSTACLE_CELL_IDS and BREADCRUMB_CELL_IDS, laid out for N = 7
+#   "generated"     obstacles placed at random for any odd N, see get_generated_layout
+#   a file name     a text grid of N lines of N cells, with the characters used by get_grid_lines:
+#                   X for an obstacle, b for a breadcrumb, . for an empty cell and S for the start.
+#                   The cells may be separated by spaces and lines starting with # are skipped.
+#
+# A layout is the list of obstacle cell ids and the list of breadcrumb cell ids, of which the
+# first config.no_breadcrumbs are used. The borders are always obstacles and the start is always
+# the middle cell. Every breadcrumb used must be reachable from the start, checked with a
+# breadth first search over the moves in env_dict.
+
+# Part of the hash of a generated layout, change it when the generation changes
+GENERATOR_VERSION = 1
+
+
+def get_layout(env_dict, config=None):
+    if config is None:
+        config = get_config()
+    if config.N % 2 == 0:
+        raise ValueError(f"Hyper.N = {config.N}, it needs to be an odd number so the start is in the middle")
+    if config.layout == "default":
+        if config.N != 7:
+            raise ValueError(f"The default layout is for N = 7, not {config.N}. Set Hyper.layout to \"generated\" or a layout file")
+        obstacle_cell_ids = list(Constants.OBSTACLE_CELL_IDS)
+        breadcrumb_cell_ids = list(Constants.BREADCRUMB_CELL_IDS)
+    elif config.layout == "generated":
+        obstacle_cell_ids, breadcrumb_cell_ids = get_generated_layout(env_dict, config)
+    else:
+        obstacle_cell_ids, breadcrumb_cell_ids = read_layout(config.layout, config.N)
+    check_layout(env_dict, obstacle_cell_ids, breadcrumb_cell_ids, config)
+    return obstacle_cell_ids, breadcrumb_cell_ids
+
+
+def get_start_cell_id(N):
+    return (N * N - 1) // 2
+
+
+def get_border_mask(N):
+    is_border = np.zeros((N, N), dtype=bool)
+    is_border[0, :] = is_border[-1, :] = is_border[:, 0] = is_border[:, -1] = True
+    return is_border.reshape(-1)
+
+
+def get_reachable(env_dict, is_obstacle, start_cell_id):
+    # The cells the agent can reach from start_cell_id without going through an obstacle
+    is_reached = np.zeros(len(is_obstacle), dtype=bool)
+    is_reached[start_cell_id] = True
+    queue = deque([start_cell_id])
+    while queue:
+        cell_id = queue.popleft()
+        for next_cell_id in env_dict[cell_id][0]:
+            if not is_reached[next_cell_id] and not is_obstacle[next_cell_id]:
+                is_reached[next_cell_id] = True
+                queue.append(next_cell_id)
+    return is_reached
+
+
+def check_layout(env_dict, obstacle_cell_ids, breadcrumb_cell_ids, config):
+    no_cells = config.N * config.N
+    start_cell_id = get_start_cell_id(config.N)
+    if len(breadcrumb_cell_ids) < config.no_breadcrumbs:
+        raise ValueError(f"The layout has {len(breadcrumb_cell_ids)} breadcrumbs, Hyper.no_breadcrumbs is {config.no_breadcrumbs}")
+    is_obstacle = get_border_mask(config.N)
+    is_obstacle[obstacle_cell_ids] = True
+    breadcrumb_cell_ids = breadcrumb_cell_ids[:config.no_breadcrumbs]
+    for cell_id in breadcrumb_cell_ids:
+        if not 0 <= cell_id < no_cells or is_obstacle[cell_id] or cell_id == start_cell_id:
+            raise ValueError(f"Breadcrumb cell {cell_id} is not an empty cell inside the grid")
+    is_reached = get_reachable(env_dict, is_obstacle, start_cell_id)
+    unreached = [cell_id for cell_id in breadcrumb_cell_ids if not is_reached[cell_id]]
+    if unreached:
+        raise ValueError(f"The breadcrumbs in cells {unreached} cannot be reached from the start")
+
+
+def read_layout(filename, N):
+    obstacle_cell_ids = []
+    breadcrumb_cell_ids = []
+    rows = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                rows.append(line.split() if " " in line else list(line))
+    if len(rows) != N or any(len(row) != N for row in rows):
+        raise ValueError(f"The layout in {filename} is not {N} by {N} cells")
+    for i, row in enumerate(rows):
+        for j, cell in enumerate(row):
+            cell_id = i * N + j
+            if cell == Constants.OBSTACLE_X:
+                obstacle_cell_ids.append(cell_id)
+            elif cell == Constants.BREADCRUMB_X:
+                breadcrumb_cell_ids.append(cell_id)
+            elif cell == Constants.START_X:
+                if cell_id != get_start_cell_id(N):
+                    raise ValueError(f"The start in {filename} must be the middle cell")
+            elif cell != Constants.EMPTY_X:
+                raise ValueError(f"Unknown cell {cell} in {filename}")
+    return obstacle_cell_ids, breadcrumb_cell_ids
+
+
+def get_cached_arrays(config, prefix, key_parts, compute):
+    # The named arrays returned by compute, kept in config.layout_cache under the hash of
+    # key_parts (strings and arrays), so every trial and process with the same key reads
+    # the same file rather than working them out again
+    key_hash = hashlib.sha1()
+    for part in key_parts:
+        key_hash.update(part.encode() if isinstance(part, str) else np.ascontiguousarray(part).tobytes())
+    filename = os.path.join(config.layout_cache, f"{prefix}_{key_hash.hexdigest()[:16]}.npz")
+    if os.path.exists(filename):
+        with np.load(filename) as cached:
+            return {name: cached[name] for name in cached.files}
+    arrays = {name: np.asarray(array) for name, array in compute().items()}
+    # Written under a temporary name and renamed, as other processes may be reading it
+    os.makedirs(config.layout_cache, exist_ok=True)
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_filename, filename)
+    return arrays
+
+
+def get_generated_layout(env_dict, config):
+    # Generated layouts are cached under the hash of their settings
+    def compute():
+        obstacle_cell_ids, breadcrumb_cell_ids = generate_layout(env_dict, config)
+        return {"obstacle_cell_ids": obstacle_cell_ids, "breadcrumb_cell_ids": breadcrumb_cell_ids}
+    settings = f"{GENERATOR_VERSION} {config.N} {config.layout_obstacle_density} {config.layout_seed}"
+    layout = get_cached_arrays(config, "layout", [settings], compute)
+    return layout["obstacle_cell_ids"].tolist(), layout["breadcrumb_cell_ids"].tolist()
+
+
+def generate_layout(env_dict, config):
+    # Make config.layout_obstacle_density of the cells inside the border obstacles, one at a
+    # time in a random order, skipping any that would cut a cell off from the start.
+    # Every other cell inside the border is a breadcrumb cell, in a random order.
+    rng = np.random.default_rng(config.layout_seed)
+    start_cell_id = get_start_cell_id(config.N)
+    is_obstacle = get_border_mask(config.N)
+    inner_cell_ids = [cell_id for cell_id in np.flatnonzero(~is_obstacle).tolist() if cell_id != start_cell_id]
+    no_obstacles = int(config.layout_obstacle_density * len(inner_cell_ids))
+    obstacle_cell_ids = []
+    for cell_id in rng.permutation(inner_cell_ids).tolist():
+        if len(obstacle_cell_ids) == no_obstacles:
+            break
+        is_obstacle[cell_id] = True
+        is_reached = get_reachable(env_dict, is_obstacle, start_cell_id)
+        if np.array_equal(is_reached, ~is_obstacle):
+            obstacle_cell_ids.append(cell_id)
+        else:
+            is_obstacle[cell_id] = False
+    open_cell_ids = [cell_id for cell_id in inner_cell_ids if not is_obstacle[cell_id]]
+    breadcrumb_cell_ids = rng.permutation(open_cell_ids).tolist()
+    return obstacle_cell_ids, breadcrumb_cell_ids
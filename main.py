@@ -1,5 +1,13 @@
 from grid import Pacman_grid
+from batch_grid import Batch_grid
 from config import Hyper, Constants
+from checkpoint import save_checkpoint, load_checkpoint, is_checkpoint_due
+from profiler import Phase_profiler
+from evaluate import Greedy_evaluator, summarise as evaluate_summarise, print_summary as print_evaluation_summary
+from planner import plan_Q_values, warm_start
+from multi_seed import get_runner, get_seeds, print_result, print_summary
+from run_log import get_logger, flush_log
+import os
 #
 # This main.py file runs the code once and produces graphs
 # This is the code you normally run
@@ -7,31 +15,87 @@ from config import Hyper, Constants
 # hyperparamters
 #
 def main():
+    log = get_logger()
     print("\n"*10)
     print("-"*100)
     print("Start of QLearning Basic design for Pacman")
     Hyper.display()
     print("-"*100)
+    if Hyper.no_seeds > 1:
+        # Train each seed in a pool of worker processes and report the spread of the results
+        runner = get_runner()
+        summary = runner.evaluate(get_seeds(), callback=print_result)
+        runner.shutdown()
+        print_summary(summary)
+        return
     pacman_grid = Pacman_grid()
-    for i in range(Hyper.total_episodes):
-        pacman_grid.reset()
-        done = False
-        while done == False:
-            if Hyper.is_ghost:
-                done = pacman_grid.ghost_step(i)
-            else:
-                done = pacman_grid.step(i)
-            pacman_grid.policy.update_epsilon()
-        episodes = i + 1
-        pacman_grid.print_episode_results(episodes)
-        pacman_grid.save_episode_stats()
+    profiler = None
+    first_episode = 0
+    if Hyper.resume and os.path.exists(Hyper.checkpoint_path):
+        first_episode = load_checkpoint(pacman_grid)
+        log.info(f"Resuming from {Hyper.checkpoint_path} after {first_episode} episodes")
+    elif Hyper.warm_start:
+        # Start from the Q table planned from the model of the grid
+        warm_start(pacman_grid, plan_Q_values(pacman_grid))
+    use_jit = False
+    if Hyper.use_jit:
+        # jit_grid is only imported when asked for, as importing it loads numba
+        from jit_grid import Jit_grid
+        use_jit = Jit_grid.is_available()
+    if Hyper.no_envs > 1:
+        # Run Hyper.no_envs grids in lockstep sharing the one Q table
+        batch_grid = Batch_grid(Hyper.no_envs, pacman_grid)
+        batch_grid.run(Hyper.total_episodes, first_episode)
+    elif use_jit:
+        # Run the episodes in compiled code
+        jit_grid = Jit_grid(pacman_grid)
+        jit_grid.run(Hyper.total_episodes, first_episode)
+    else:
+        if Hyper.use_jit:
+            log.warning("numba or the dense Q table is not available, or Hyper.replay or other ghosts are set, running the Python loop")
+        if Hyper.profile:
+            profiler = Phase_profiler(pacman_grid, Hyper.profile_block_episodes, Hyper.profile_path)
+            profiler.start()
+        for i in range(first_episode, Hyper.total_episodes):
+            pacman_grid.reset()
+            done = False
+            while done == False:
+                if Hyper.is_ghost:
+                    done = pacman_grid.ghost_step(i)
+                else:
+                    done = pacman_grid.step(i)
+                pacman_grid.policy.update_epsilon()
+            episodes = i + 1
+            if Hyper.print_episodes:
+                pacman_grid.log_episode_results(episodes)
+            pacman_grid.save_episode_stats()
+            if profiler:
+                profiler.end_episode(episodes)
+            if is_checkpoint_due(episodes, pacman_grid.config):
+                save_checkpoint(pacman_grid, episodes)
+        if profiler:
+            profiler.stop(Hyper.total_episodes)
 
-    pacman_grid.print_results()
+    # The episodes since the last summary line
+    pacman_grid.episode_log.flush(Hyper.total_episodes)
+    pacman_grid.metrics.flush()
+    if Hyper.evaluate_after_training:
+        evaluator = Greedy_evaluator(pacman_grid)
+        print_evaluation_summary(evaluate_summarise(evaluator.run(Hyper.eval_episodes)), evaluator.epsilon)
+    report_process = pacman_grid.print_results()
     print("\n"*5)  
     print("-"*100)
     Hyper.display()
+    print(pacman_grid.Q.get_memory_footprint())
+    if pacman_grid.replay is not None:
+        print(pacman_grid.replay.get_memory_footprint())
+    if profiler:
+        profiler.print_summary()
     print("End of QLearning Basic design for Pacman")
     print("-"*100)
+    flush_log()
+    if report_process is not None:
+        report_process.join()
     
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -10,6 +10,7 @@
 #SBATCH --partition=normal
 #SBATCH --gres=gpu:1
 
-module load python/3.6.12
+# Python 3.7 or later, for time.perf_counter_ns in profiler.py
+module load python/3.9.7
 
 python main.py
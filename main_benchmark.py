@@ -0,0 +1,163 @@
+import sys
+import json
+import time
+import platform
+import itertools
+import multiprocessing
+import numpy as np
+from config import Hyper
+
+# resource is not available on Windows, the peak memory is then left out
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# This code measures how fast the training runs, so that a change that slows it
+# down can be seen by comparing the JSON written here between two versions:
+#
+#   python main_benchmark.py [benchmark.json]
+#
+# Every combination of Hyper.benchmark_N, Hyper.benchmark_breadcrumbs and
+# Hyper.benchmark_ghost is run for Hyper.benchmark_episodes episodes of the main.py
+# loop, seeded from Hyper.seed. Each one reports the steps and episodes per second,
+# the size of the Q table and the peak memory, then times Q_learn.update and
+# Policy.get_with_available_actions on their own (the best of Hyper.benchmark_repeats
+# runs of Hyper.benchmark_calls calls).
+# Each configuration runs in a new process, so that its peak memory is its own.
+
+
+def run_configuration(settings):
+    for name, value in settings.items():
+        setattr(Hyper, name, value)
+    Hyper.print_episodes = False
+    # The few episodes of a benchmark are kept in memory, rather than written over the
+    # metrics of a training run
+    Hyper.metrics_path = None
+    from grid import Pacman_grid
+    np.random.seed(Hyper.seed)
+    start = time.perf_counter()
+    pacman_grid = Pacman_grid()
+    setup_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(Hyper.benchmark_episodes):
+        pacman_grid.reset()
+        done = False
+        while done == False:
+            if Hyper.is_ghost:
+                done = pacman_grid.ghost_step(i)
+            else:
+                done = pacman_grid.step(i)
+            pacman_grid.policy.update_epsilon()
+        pacman_grid.save_episode_stats()
+    run_seconds = time.perf_counter() - start
+    no_steps = int(pacman_grid.metrics.read()["steps"].sum())
+
+    result = dict(settings)
+    result["setup_seconds"] = setup_seconds
+    result["run_seconds"] = run_seconds
+    result["steps"] = no_steps
+    result["steps_per_second"] = no_steps / run_seconds
+    result["episodes_per_second"] = Hyper.benchmark_episodes / run_seconds
+    result["Q_table_bytes"] = int(pacman_grid.Q.Q_table.nbytes)
+    result["update_calls_per_second"] = time_update(pacman_grid)
+    result["action_calls_per_second"] = time_get_with_available_actions(pacman_grid)
+    result["peak_rss_bytes"] = get_peak_rss()
+    return result
+
+
+def get_sample_cells(pacman_grid):
+    # Random cells the agent can be on
+    cell_ids = np.nonzero(~pacman_grid.tables.is_obstacle)[0]
+    cell_ids = cell_ids[np.random.randint(0, len(cell_ids), Hyper.benchmark_calls)]
+    return cell_ids.tolist()
+
+
+def time_update(pacman_grid):
+    Q = pacman_grid.Q
+    cell_ids = get_sample_cells(pacman_grid)
+    actions = np.random.randint(0, 4, len(cell_ids)).tolist()
+    new_cell_ids = [pacman_grid.move_cells[cell_id][action] for cell_id, action in zip(cell_ids, actions)]
+    best = None
+    for _ in range(Hyper.benchmark_repeats):
+        start = time.perf_counter()
+        for cell_id, new_cell_id, action in zip(cell_ids, new_cell_ids, actions):
+            Q.update(cell_id, new_cell_id, action, -1)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return len(cell_ids) / best
+
+
+def time_get_with_available_actions(pacman_grid):
+    Q = pacman_grid.Q
+    policy = pacman_grid.policy
+    # Half of the calls are greedy
+    policy.epsilon = 0.5
+    cell_ids = get_sample_cells(pacman_grid)
+    available_actions = []
+    for cell_id in cell_ids:
+        # With the ghost, it is next to the agent for half of the calls
+        is_ghost_next = Hyper.is_ghost and np.random.random() < 0.5
+        pacman_grid.agent_cell_id = cell_id
+        pacman_grid.ghost_cell_ids = [pacman_grid.neighbour_cells[cell_id][np.random.randint(0, 4)]] if is_ghost_next else []
+        available_actions.append(pacman_grid.get_available_actions_including_ghost())
+    best = None
+    for _ in range(Hyper.benchmark_repeats):
+        start = time.perf_counter()
+        for cell_id, actions in zip(cell_ids, available_actions):
+            policy.get_with_available_actions(cell_id, Q, actions)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return len(cell_ids) / best
+
+
+def get_peak_rss():
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    return peak_rss
+
+
+def get_configurations():
+    for N, no_breadcrumbs, is_ghost in itertools.product(Hyper.benchmark_N, Hyper.benchmark_breadcrumbs, Hyper.benchmark_ghost):
+        yield {
+            "N": N,
+            "no_breadcrumbs": no_breadcrumbs,
+            "is_ghost": is_ghost,
+            # The default layout is only for N = 7, other sizes use a generated map
+            "layout": "generated" if Hyper.layout == "default" and N != 7 else Hyper.layout,
+            "q_table": Hyper.q_table,
+            "seed": Hyper.seed,
+            "benchmark_episodes": Hyper.benchmark_episodes,
+            "benchmark_calls": Hyper.benchmark_calls,
+            "benchmark_repeats": Hyper.benchmark_repeats}
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else Hyper.benchmark_path
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for settings in get_configurations():
+        with context.Pool(1) as pool:
+            result = pool.apply(run_configuration, (settings,))
+        print(f"N = {result['N']}, breadcrumbs = {result['no_breadcrumbs']}, ghost = {result['is_ghost']}: "
+              f"{result['steps_per_second']:.0f} steps/s, {result['episodes_per_second']:.1f} episodes/s, "
+              f"update {result['update_calls_per_second']:.0f}/s, action {result['action_calls_per_second']:.0f}/s, "
+              f"Q table {result['Q_table_bytes'] / 2**20:.2f} MB, peak RSS {(result['peak_rss_bytes'] or 0) / 2**20:.1f} MB")
+        results.append(result)
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results}
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import sys
+import time
+from grid import Pacman_grid
+from config import Hyper
+from checkpoint import get_mismatched_settings
+from evaluate import Greedy_evaluator, summarise, print_summary
+
+# This code judges a trained agent without training it further.
+# It loads the Q table of the checkpoint in Hyper.checkpoint_path (or the directory
+# given on the command line) and runs Hyper.eval_episodes greedy episodes, see evaluate.py
+#
+#   python main_evaluate.py [checkpoint directory]
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else Hyper.checkpoint_path
+    pacman_grid = Pacman_grid()
+    mismatched = get_mismatched_settings(pacman_grid.config, path)
+    if mismatched:
+        # A table trained on another map or with other settings would be judged on this one
+        settings = ", ".join(f"Hyper.{name} = {saved} rather than {setting}" for name, saved, setting in mismatched)
+        raise ValueError(f"The checkpoint in {path} was trained with {settings}")
+    pacman_grid.Q.Q_table.load(path)
+    evaluator = Greedy_evaluator(pacman_grid)
+    start = time.perf_counter()
+    results = evaluator.run(Hyper.eval_episodes)
+    seconds = time.perf_counter() - start
+    print_summary(summarise(results), evaluator.epsilon)
+    print(f"{Hyper.eval_episodes} episodes in {seconds:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
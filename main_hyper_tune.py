@@ -1,47 +1,156 @@
+import os
 from grid import Pacman_grid
-from config import Hyper, Constants
+from config import Hyper, Constants, SEARCH_SPACE, get_config
+import numpy as np
 import optuna
+from optuna.trial import TrialState
+from multi_seed import get_runner
+from config_batch import Config_batch
 
 
 # This code is the same as in main.py except
 # it is using the Optuna library to 
 # tune the hyperparameters
 # Instead of producing graphs, it produces statistics
+# Each trial trains with its own config (see get_config) and Hyper is never changed,
+# so trials can run side by side in one process
+# With Hyper.tune_batch_size > 1 the trials are trained Hyper.tune_batch_size at a time
+# in a Config_batch, see optimize_in_batches
+# main_parallel_tune.py runs the same objective in several processes
+
+
+def get_trial_config(trial):
+    # The settings of a trial, Hyper with the hyperparameters of SEARCH_SPACE suggested by Optuna.
+    # Each trial writes its metrics to its own directory.
+    settings = {name: trial.suggest_float(f"Hyper.{name}", low, high) for name, (low, high) in SEARCH_SPACE.items()}
+    path = Hyper.metrics_path
+    return get_config(print_episodes=False, metrics_path=os.path.join(path, f"trial_{trial.number}") if path else None, **settings)
 
 
 def objective(trial):
-    Hyper.print_episodes = False
-    Hyper.gamma = trial.suggest_float("Hyper.gamma", 0.01, 0.99)
-    Hyper.alpha = trial.suggest_float("Hyper.alpha", 0.01, 0.99)
-    Hyper.init_epsilon = trial.suggest_float("Hyper.init_epsilon", 0.9, 1)
-    Hyper.epsilon_threshold = trial.suggest_float("Hyper.epsilon_threshold", 0.001, 0.1)
-    Hyper.decay = trial.suggest_float("Hyper.decay", 0.990, 0.999)
-    pacman_grid = Pacman_grid()
-    for i in range(Hyper.total_episodes):
+    config = get_trial_config(trial)
+    if config.tune_seeds > 1:
+        return evaluate_seeds(trial, config)
+    # Seed each trial from its number so that a trial can be rerun on its own
+    pacman_grid = Pacman_grid(config.seed + trial.number, config)
+    for i in range(config.total_episodes):
         pacman_grid.reset()
         done = False
         while done == False:
-            if Hyper.is_ghost:
+            if config.is_ghost:
                 done = pacman_grid.ghost_step(i)
             else:
                 done = pacman_grid.step(i)
             pacman_grid.policy.update_epsilon()
         episodes = i + 1
-        if Hyper.print_episodes:
-            pacman_grid.print_episode_results(episodes)
+        if config.print_episodes:
+            pacman_grid.log_episode_results(episodes)
         pacman_grid.save_episode_stats()
+        if episodes % config.prune_interval == 0 and episodes < config.total_episodes:
+            # Report the rolling reward so that the pruner can stop a hopeless trial early
+            trial.report(get_reward_for_last_sample(pacman_grid), episodes)
+            if trial.should_prune():
+                trial.set_user_attr("episodes_run", episodes)
+                raise optuna.TrialPruned()
+
+    trial.set_user_attr("episodes_run", config.total_episodes)
+    return get_reward_for_last_sample(pacman_grid)
+
+
+def evaluate_seeds(trial, config):
+    # Train config.tune_seeds seeds in the pool of multi_seed.py and return their mean final reward.
+    # The mean so far is reported as each seed finishes, against the episodes trained so far,
+    # so the pruner can stop the trial without waiting for the other seeds.
+    first_seed = config.seed + trial.number * config.tune_seeds
+    seeds = list(range(first_seed, first_seed + config.tune_seeds))
+    rewards = []
+    for result in get_runner().run(seeds, config):
+        rewards.append(result["reward"])
+        episodes = len(rewards) * config.total_episodes
+        if len(rewards) < len(seeds):
+            trial.report(float(np.mean(rewards)), episodes)
+            if trial.should_prune():
+                trial.set_user_attr("episodes_run", episodes)
+                raise optuna.TrialPruned()
+    trial.set_user_attr("episodes_run", len(seeds) * config.total_episodes)
+    return float(np.mean(rewards))
+
+
+def optimize_in_batches(study, n_trials):
+    # Run n_trials trials, asking Optuna for Hyper.tune_batch_size of them at a time and
+    # training them side by side in a Config_batch. Each trial gets the same episodes as
+    # objective gives it, and is reported and pruned in the same way.
+    if Hyper.tune_seeds > 1:
+        raise ValueError("Hyper.tune_batch_size > 1 trains one seed per trial, set Hyper.tune_seeds = 1")
+    while n_trials > 0:
+        trials = [study.ask() for _ in range(min(Hyper.tune_batch_size, n_trials))]
+        configs = [get_trial_config(trial) for trial in trials]
+        seeds = [config.seed + trial.number for config, trial in zip(configs, trials)]
+        is_pruned = [False] * len(trials)
+
+        def report(k, pacman_grid):
+            trial = trials[k]
+            config = pacman_grid.config
+            episodes = pacman_grid.metrics.no_episodes
+            if episodes % config.prune_interval == 0 and episodes < config.total_episodes:
+                trial.report(get_reward_for_last_sample(pacman_grid), episodes)
+                if trial.should_prune():
+                    trial.set_user_attr("episodes_run", episodes)
+                    is_pruned[k] = True
+            return is_pruned[k]
+
+        grids = Config_batch(configs, seeds).run(report)
+        for k, trial in enumerate(trials):
+            if is_pruned[k]:
+                study.tell(trial, state=TrialState.PRUNED)
+            else:
+                trial.set_user_attr("episodes_run", configs[k].total_episodes)
+                study.tell(trial, get_reward_for_last_sample(grids[k]))
+        n_trials -= len(trials)
 
-    # Average the rewards at the end to even out any outlier results caused
-    # by the stochastic environment.
-    sample = 100
-    last_sample = -1 * sample
-    reward_for_last_sample_episode = sum(pacman_grid.rewards_per_episode[last_sample:]) / sample
+
+def get_reward_for_last_sample(pacman_grid):
+    # Average the rewards over the last Hyper.rolling_window episodes to even out any
+    # outlier results caused by the stochastic environment.
+    reward_for_last_sample_episode = pacman_grid.metrics.rolling.get_mean()
     return reward_for_last_sample_episode
-    
-study = optuna.create_study(direction="maximize", pruner=optuna.pruners.MedianPruner())
-# Note n_trials=10000. This is a lot of trials and will take a long time to run, but the results will be better
-study.optimize(objective, n_trials=10000)
-print("Number of finished trials: ", len(study.trials))
-print(study.best_params)
-print(study.best_value)     
-    
\ No newline at end of file
+
+
+def create_pruner():
+    # No trial is pruned before Hyper.prune_startup_trials trials have completed,
+    # or before Hyper.prune_warmup_episodes episodes of the trial have run
+    return optuna.pruners.MedianPruner(
+        n_startup_trials=Hyper.prune_startup_trials,
+        n_warmup_steps=Hyper.prune_warmup_episodes)
+
+
+def print_pruning_summary(study):
+    # Show how many episodes the pruner saved against running every trial to the end
+    trials = study.get_trials(deepcopy=False, states=(TrialState.COMPLETE, TrialState.PRUNED))
+    pruned = [trial for trial in trials if trial.state == TrialState.PRUNED]
+    episodes_per_trial = Hyper.total_episodes * Hyper.tune_seeds
+    episodes_run = sum(trial.user_attrs.get("episodes_run", episodes_per_trial) for trial in trials)
+    episodes_full = len(trials) * episodes_per_trial
+    episodes_skipped = episodes_full - episodes_run
+    print(f"Pruned {len(pruned)} of {len(trials)} trials")
+    if len(pruned) > 0:
+        print(f"Episodes skipped per pruned trial: {episodes_skipped / len(pruned):.1f}")
+    if episodes_full > 0:
+        print(f"Episodes run {episodes_run} of {episodes_full}, {episodes_skipped / episodes_full * 100:.1f}% saved")
+
+
+def main():
+    study = optuna.create_study(direction="maximize", pruner=create_pruner())
+    # Note n_trials=10000. This is a lot of trials and will take a long time to run, but the results will be better
+    if Hyper.tune_batch_size > 1:
+        optimize_in_batches(study, Hyper.tune_trials)
+    else:
+        study.optimize(objective, n_trials=Hyper.tune_trials)
+    print("Number of finished trials: ", len(study.trials))
+    print(study.best_params)
+    print(study.best_value)     
+    print_pruning_summary(study)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import os
+import multiprocessing
+import optuna
+from optuna.study import MaxTrialsCallback
+from optuna.trial import TrialState
+from config import Hyper
+from main_hyper_tune import objective, optimize_in_batches, create_pruner, print_pruning_summary
+
+# This code runs the objective in main_hyper_tune.py in several worker processes.
+# The workers share one Optuna study held in Hyper.tune_storage, either a journal
+# file or a database URL such as sqlite:///pacman_tune.db.
+# The study is loaded if it already exists, so a run that was stopped carries on
+# from the trials already in the storage until Hyper.tune_trials have finished.
+# The number of workers is Hyper.tune_workers, or the number of SLURM tasks per node
+# when run through main_tune.sh
+
+
+def get_storage():
+    if "://" in Hyper.tune_storage:
+        return Hyper.tune_storage
+    try:
+        from optuna.storages.journal import JournalFileBackend
+    except ImportError:
+        # Optuna versions before 4.0
+        from optuna.storages import JournalFileStorage as JournalFileBackend
+    return optuna.storages.JournalStorage(JournalFileBackend(Hyper.tune_storage))
+
+
+def create_study():
+    return optuna.create_study(
+        study_name=Hyper.tune_study_name,
+        storage=get_storage(),
+        direction="maximize",
+        pruner=create_pruner(),
+        load_if_exists=True)
+
+
+def worker(worker_id):
+    # Each worker samples with its own seed, the episodes of a trial are seeded
+    # from the trial number in objective
+    study = create_study()
+    study.sampler = optuna.samplers.TPESampler(seed=Hyper.seed + worker_id)
+    states = (TrialState.COMPLETE, TrialState.PRUNED)
+    if len(study.get_trials(deepcopy=False, states=states)) >= Hyper.tune_trials:
+        return
+    if Hyper.tune_batch_size > 1:
+        # Ask for a batch at a time until the study has Hyper.tune_trials finished trials.
+        # The trials other workers are running count too, so the study does not overshoot.
+        while True:
+            no_remaining = Hyper.tune_trials - len(study.get_trials(deepcopy=False, states=states + (TrialState.RUNNING,)))
+            if no_remaining <= 0:
+                return
+            optimize_in_batches(study, min(no_remaining, Hyper.tune_batch_size))
+    stop_after_trials = MaxTrialsCallback(Hyper.tune_trials, states=states)
+    study.optimize(objective, callbacks=[stop_after_trials])
+
+
+def main():
+    no_workers = int(os.environ.get("SLURM_NTASKS_PER_NODE", Hyper.tune_workers))
+    # Create the study before starting the workers so they do not race to create it
+    study = create_study()
+    print(f"Tuning with {no_workers} workers, {len(study.trials)} trials already in {Hyper.tune_storage}")
+    workers = [multiprocessing.Process(target=worker, args=(worker_id,)) for worker_id in range(no_workers)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    study = create_study()
+    print("Number of finished trials: ", len(study.trials))
+    print(study.best_params)
+    print(study.best_value)
+    print_pruning_summary(study)
+
+
+if __name__ == "__main__":
+    main()
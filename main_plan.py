@@ -0,0 +1,49 @@
+import os
+import time
+import numpy as np
+from grid import Pacman_grid
+from config import Hyper, get_config
+from planner import plan_Q_values, warm_start
+from evaluate import Greedy_evaluator, summarise, print_summary
+from checkpoint import get_mismatched_settings
+
+# This code works out the optimal Q table of the grid without the ghost by value
+# iteration over the model of the grid (see planner.py) and runs the greedy policy
+# of it. If there is a checkpoint in Hyper.checkpoint_path, the Q table learnt there
+# is compared with the optimal one on the rows it visited, if it was trained on the
+# same grid without the ghost.
+
+
+def main():
+    config = get_config(is_ghost=False)
+    pacman_grid = Pacman_grid(config=config)
+    start = time.perf_counter()
+    Q_values = plan_Q_values(pacman_grid)
+    seconds = time.perf_counter() - start
+    start_cell_id = pacman_grid.tables.start_cell_id
+    print(f"Planned {Hyper.no_breadcrumbs} breadcrumbs in {seconds:.2f} s, "
+          f"optimal value of the start {Q_values[start_cell_id, 0].max():.3f}")
+    warm_start(pacman_grid, Q_values)
+    evaluator = Greedy_evaluator(pacman_grid)
+    print_summary(summarise(evaluator.run(Hyper.eval_episodes)), evaluator.epsilon)
+
+    mismatched = get_mismatched_settings(config, Hyper.checkpoint_path) if os.path.exists(Hyper.checkpoint_path) else []
+    if mismatched:
+        # A checkpoint trained with the ghost, or on another grid, has other rows and actions
+        settings = ", ".join(f"Hyper.{name} = {saved} rather than {setting}" for name, saved, setting in mismatched)
+        print(f"Not comparing with the checkpoint in {Hyper.checkpoint_path}, it was trained with {settings}")
+    elif os.path.exists(Hyper.checkpoint_path):
+        learnt_grid = Pacman_grid(config=config)
+        learnt_grid.Q.Q_table.load(Hyper.checkpoint_path)
+        learnt_values = learnt_grid.Q.Q_table.to_dense()
+        is_visited = np.any(learnt_values != 0, axis=2)
+        learnt_rows = learnt_values[is_visited].astype(np.float64)
+        optimal_rows = Q_values[is_visited]
+        is_same_action = np.argmax(learnt_rows, axis=1) == np.argmax(optimal_rows, axis=1)
+        print(f"The Q table in {Hyper.checkpoint_path} on its {len(learnt_rows)} visited rows: "
+              f"mean |Q - Q*| {np.abs(learnt_rows - optimal_rows).mean():.3f}, "
+              f"same greedy action as the optimal one in {is_same_action.mean() * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import numpy as np
+from grid import Pacman_grid
+from config import Hyper, get_config
+from multi_seed import train_grid
+from q_table import Q_DTYPES
+from evaluate import Greedy_evaluator, summarise
+
+# This code reports how much accuracy each Q table precision (Hyper.q_dtype) gives up
+# against float64. Every dtype in Hyper.q_dtype_report is trained with the same seed and
+# settings, and compared with the float64 table on the rows float64 training visited:
+# the largest and mean difference in Q value, and how often the greedy action is the same.
+# Training takes a different path as soon as a rounded value changes an action, so the
+# largest error of storing the float64 table itself in the dtype is shown too.
+# The final rolling reward of training, the greedy win rate and the size of the table
+# are shown for each one.
+
+
+def train(config, q_dtype):
+    pacman_grid = Pacman_grid(config=config._replace(q_dtype=q_dtype))
+    train_grid(pacman_grid)
+    evaluation = summarise(Greedy_evaluator(pacman_grid).run(config.eval_episodes))
+    return pacman_grid, evaluation
+
+
+def get_stored(values, q_dtype):
+    # values as they would be read back from a table of q_dtype
+    if q_dtype == "int16":
+        return np.clip(np.rint(values / Hyper.q_int16_step), -32767, 32767) * Hyper.q_int16_step
+    return values.astype(Q_DTYPES[q_dtype]).astype(np.float64)
+
+
+def main():
+    # Each dtype trains a grid of its own, so the metrics are kept in memory rather than
+    # written over each other in metrics_path
+    config = get_config(print_episodes=False, metrics_path=None)
+    reference, reference_evaluation = train(config, "float64")
+    reference_values = reference.Q.Q_table.to_dense()
+    # The rows float64 training wrote to
+    is_visited = np.any(reference_values != 0, axis=2)
+    reference_rows = reference_values[is_visited]
+    print(f"Compared on {len(reference_rows)} visited (cell, state space index) rows, "
+          f"{Hyper.total_episodes} training episodes and {Hyper.eval_episodes} greedy episodes")
+    print(f"{'dtype':<10}{'MB':>10}{'stored |dQ|':>13}{'max |dQ|':>12}{'mean |dQ|':>12}{'same action':>13}{'reward':>10}{'win rate':>10}")
+    for name in Hyper.q_dtype_report:
+        if name == "float64":
+            pacman_grid, evaluation = reference, reference_evaluation
+        else:
+            pacman_grid, evaluation = train(config, name)
+        rows = pacman_grid.Q.Q_table.to_dense()[is_visited].astype(np.float64)
+        stored_difference = np.abs(get_stored(reference_rows, name) - reference_rows).max()
+        difference = np.abs(rows - reference_rows)
+        is_same_action = np.argmax(rows, axis=1) == np.argmax(reference_rows, axis=1)
+        print(f"{name:<10}{pacman_grid.Q.Q_table.nbytes / 2**20:>10.2f}{stored_difference:>13.4f}{difference.max():>12.4f}{difference.mean():>12.4f}"
+              f"{is_same_action.mean() * 100:>12.1f}%{pacman_grid.metrics.rolling.get_mean():>10.1f}{evaluation['win_rate'] * 100:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import time
+from sweep import Sweep_runner, print_summary
+
+# This code tunes the hyperparameters of SEARCH_SPACE by successive halving (or Hyperband
+# with Hyper.sweep_mode = "hyperband"), see sweep.py, as a cheaper alternative to
+# main_hyper_tune.py that needs no Optuna. The best configuration is left trained in full
+# in its checkpoint under Hyper.sweep_path.
+
+
+def main():
+    start = time.perf_counter()
+    runner = Sweep_runner()
+    try:
+        config, result, no_configs = runner.run()
+    finally:
+        runner.shutdown()
+    print_summary(config, result, no_configs, runner.episodes_run, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@
 #SBATCH --partition=normal
 #SBATCH --gres=gpu:1
 
-module load python/3.6.12
+# Python 3.7 or later: the journal storage of main_parallel_tune.py needs Optuna 3.1+
+module load python/3.9.7
 
-python main_hyper_tune.py
+python main_parallel_tune.py
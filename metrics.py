@@ -0,0 +1,151 @@
+import os
+import glob
+import numpy as np
+from config import get_config
+from rolling_stats import Rolling_stats
+
+# One record per episode
+EPISODE_DTYPE = np.dtype([
+    ("episode", np.int64),
+    ("steps", np.int32),
+    ("reward", np.int32),
+    ("won", np.bool_),
+    ("epsilon", np.float64),
+    ("ghost_caught", np.bool_)])
+
+
+def get_chunk_filenames(path):
+    return sorted(glob.glob(os.path.join(path, "episodes_*.npy")))
+
+
+def read_metrics(path):
+    # Read the episode records written to path so far.
+    # This can be called from another process while the training is still running.
+    chunks = [np.load(filename) for filename in get_chunk_filenames(path)]
+    if len(chunks) == 0:
+        return np.zeros(0, dtype=EPISODE_DTYPE)
+    return np.concatenate(chunks)
+
+
+class Episode_metrics:
+    # Collects the statistics of each episode into a fixed size buffer of records.
+    # When the buffer is full it is flushed as one chunk:
+    # with a path (config.metrics_path) each chunk is appended to the directory as
+    # episodes_<first episode>.npy, so memory stays the same however long the run and the
+    # episodes so far can be read with read_metrics while training. Without a path the
+    # chunks are kept in memory. config is the settings of the run, Hyper by default.
+    def __init__(self, config=None):
+        if config is None:
+            config = get_config()
+        self.path = config.metrics_path
+        self.chunk_size = config.metrics_chunk_size
+        self.buffer = np.zeros(self.chunk_size, dtype=EPISODE_DTYPE)
+        self.no_buffered = 0
+        self.no_episodes = 0
+        # The chunks kept in memory when there is no path
+        self.chunks = []
+        # The last chunk_size records flushed, for get_last
+        self.recent = np.zeros(0, dtype=EPISODE_DTYPE)
+        # Statistics over the last config.rolling_window episodes that can be read while training
+        self.rolling = Rolling_stats(config.rolling_window)
+        self.is_started = False
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+
+    def add(self, steps, reward, won, epsilon, ghost_caught):
+        if not self.is_started:
+            self.start()
+        record = self.buffer[self.no_buffered]
+        self.no_episodes += 1
+        record["episode"] = self.no_episodes
+        record["steps"] = steps
+        record["reward"] = reward
+        record["won"] = won
+        record["epsilon"] = epsilon
+        record["ghost_caught"] = ghost_caught
+        self.rolling.add(reward, won)
+        self.no_buffered += 1
+        if self.no_buffered == self.chunk_size:
+            self.flush()
+
+    def add_batch(self, steps, rewards, won, epsilons, ghost_caught):
+        # Add the records of several episodes, given as arrays
+        if not self.is_started:
+            self.start()
+        no_records = len(steps)
+        self.rolling.add_batch(rewards, won)
+        first = 0
+        while first < no_records:
+            no_copied = min(no_records - first, self.chunk_size - self.no_buffered)
+            records = self.buffer[self.no_buffered:self.no_buffered + no_copied]
+            last = first + no_copied
+            records["episode"] = np.arange(self.no_episodes + 1, self.no_episodes + no_copied + 1)
+            records["steps"] = steps[first:last]
+            records["reward"] = rewards[first:last]
+            records["won"] = won[first:last]
+            records["epsilon"] = epsilons[first:last]
+            records["ghost_caught"] = ghost_caught[first:last]
+            self.no_episodes += no_copied
+            self.no_buffered += no_copied
+            first = last
+            if self.no_buffered == self.chunk_size:
+                self.flush()
+
+    def start(self):
+        # Chunks left over from an earlier run after this point are out of date
+        self.is_started = True
+        if self.path:
+            for filename in get_chunk_filenames(self.path):
+                if self.get_first_episode(filename) > self.no_episodes:
+                    os.remove(filename)
+
+    def flush(self):
+        if self.no_buffered == 0:
+            return
+        chunk = self.buffer[:self.no_buffered].copy()
+        if self.path:
+            # Write the chunk under a temporary name and rename it, so that
+            # a reader never sees a chunk that is half written
+            filename = os.path.join(self.path, f"episodes_{chunk['episode'][0]:010d}.npy")
+            tmp_filename = filename + ".tmp"
+            with open(tmp_filename, "wb") as f:
+                np.save(f, chunk)
+            os.replace(tmp_filename, filename)
+        else:
+            self.chunks.append(chunk)
+        self.recent = np.concatenate((self.recent, chunk))[-self.chunk_size:]
+        self.no_buffered = 0
+
+    def read(self):
+        # All of the episode records so far
+        if self.path:
+            chunks = [read_metrics(self.path)]
+        else:
+            chunks = list(self.chunks)
+        chunks.append(self.buffer[:self.no_buffered])
+        return np.concatenate(chunks)
+
+    def get_last(self, no_records):
+        # The records of the last no_records episodes, up to the chunk size
+        records = np.concatenate((self.recent, self.buffer[:self.no_buffered]))
+        return records[-no_records:]
+
+    def resume(self, no_episodes, records=None):
+        # Carry on after no_episodes episodes, from a checkpoint.
+        # Without a path the records of those episodes are given, as they were only held in memory.
+        self.no_buffered = 0
+        self.no_episodes = no_episodes
+        self.is_started = False
+        if self.path:
+            filenames = [filename for filename in get_chunk_filenames(self.path) if self.get_first_episode(filename) <= no_episodes]
+            chunks = [np.load(filename) for filename in filenames[-2:]]
+            records = np.concatenate(chunks) if len(chunks) > 0 else np.zeros(0, dtype=EPISODE_DTYPE)
+        else:
+            self.chunks = [records]
+        self.recent = records[-self.chunk_size:]
+        self.rolling = Rolling_stats(self.rolling.window)
+        self.rolling.add_batch(self.recent["reward"], self.recent["won"])
+
+    @staticmethod
+    def get_first_episode(filename):
+        return int(os.path.basename(filename)[len("episodes_"):-len(".npy")])
@@ -0,0 +1,153 @@
+import os
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from config import Hyper, get_config
+
+# Train the same configuration with several seeds in a pool of worker processes,
+# to see how much of a result is down to the stochastic environment.
+# Each seed trains a new Pacman_grid(seed, config) for config.total_episodes episodes, with
+# the Batch_grid, jit or Python loop chosen as in main.py, and its final reward and win rate
+# are the rolling mean over the last config.rolling_window episodes.
+# The pool is kept for the life of the process (see get_runner), so a tuning study pays
+# for starting the workers and importing the modules once rather than once per trial.
+# The config (see get_config) is sent with every seed, as it changes between trials,
+# and the workers never change Hyper.
+
+# Two sided 95% Student t values for 1 to 30 degrees of freedom, the normal value after that
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def train_seed(seed, config):
+    # Runs in a worker process
+    from grid import Pacman_grid
+    start = time.perf_counter()
+    # Each seed writes its metrics to its own directory, and saves no checkpoints, so that
+    # the workers do not overwrite each other's files
+    path = config.metrics_path
+    config = config._replace(print_episodes=False, checkpoint_interval=0,
+                             metrics_path=os.path.join(path, f"seed_{seed}") if path else None)
+    pacman_grid = Pacman_grid(seed, config)
+    train_grid(pacman_grid)
+    pacman_grid.metrics.flush()
+    rolling = pacman_grid.metrics.rolling
+    return {
+        "seed": seed,
+        "reward": rolling.get_mean(),
+        "win_rate": rolling.get_win_rate(),
+        "episodes": pacman_grid.metrics.no_episodes,
+        "seconds": time.perf_counter() - start}
+
+
+def train_grid(pacman_grid, first_episode=0, total_episodes=None):
+    # Train from first_episode up to total_episodes (config.total_episodes by default)
+    # with no checkpoints or printing
+    from batch_grid import Batch_grid
+    config = pacman_grid.config
+    if total_episodes is None:
+        total_episodes = config.total_episodes
+    use_jit = False
+    if config.use_jit:
+        # jit_grid is only imported when asked for, as importing it loads numba
+        from jit_grid import Jit_grid
+        use_jit = Jit_grid.is_available(config)
+    if config.no_envs > 1:
+        Batch_grid(config.no_envs, pacman_grid).run(total_episodes, first_episode)
+    elif use_jit:
+        Jit_grid(pacman_grid).run(total_episodes, first_episode)
+    else:
+        for i in range(first_episode, total_episodes):
+            pacman_grid.reset()
+            done = False
+            while done == False:
+                if config.is_ghost:
+                    done = pacman_grid.ghost_step(i)
+                else:
+                    done = pacman_grid.step(i)
+                pacman_grid.policy.update_epsilon()
+            pacman_grid.save_episode_stats()
+
+
+def get_confidence_interval(values):
+    # The mean and the half width of its 95% confidence interval
+    values = np.asarray(values, dtype=np.float64)
+    mean = values.mean()
+    if len(values) < 2:
+        return mean, math.inf
+    no_dof = len(values) - 1
+    t = T_95[no_dof - 1] if no_dof <= len(T_95) else 1.96
+    return mean, t * values.std(ddof=1) / math.sqrt(len(values))
+
+
+def summarise(results):
+    reward, reward_ci = get_confidence_interval([result["reward"] for result in results])
+    win_rate, win_rate_ci = get_confidence_interval([result["win_rate"] for result in results])
+    return {
+        "no_seeds": len(results),
+        "reward": reward,
+        "reward_ci": reward_ci,
+        "win_rate": win_rate,
+        "win_rate_ci": win_rate_ci,
+        "results": sorted(results, key=lambda result: result["seed"])}
+
+
+class Multi_seed_runner:
+    def __init__(self, no_workers=None):
+        self.no_workers = no_workers or Hyper.seed_workers
+        self.executor = ProcessPoolExecutor(max_workers=self.no_workers)
+
+    def run(self, seeds, config=None):
+        # Yield the result of each seed as soon as it finishes, in the order they finish.
+        # Seeds not started yet are cancelled if the caller stops early.
+        # config is the settings to train with, the values in Hyper by default.
+        if config is None:
+            config = get_config()
+        futures = [self.executor.submit(train_seed, seed, config) for seed in seeds]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def evaluate(self, seeds, callback=None, config=None):
+        # Train every seed and return the summary. callback is called with each result
+        # and the results so far as they come in.
+        results = []
+        for result in self.run(seeds, config):
+            results.append(result)
+            if callback:
+                callback(result, results)
+        return summarise(results)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+runner = None
+
+
+def get_runner():
+    # The runner shared by every caller in this process
+    global runner
+    if runner is None:
+        runner = Multi_seed_runner()
+    return runner
+
+
+def get_seeds(first_seed=None):
+    first_seed = Hyper.seed if first_seed is None else first_seed
+    return list(range(first_seed, first_seed + Hyper.no_seeds))
+
+
+def print_result(result, results):
+    print(f"Seed {result['seed']}: final reward {result['reward']:.2f}, win rate {result['win_rate'] * 100:.1f}% "
+          f"in {result['seconds']:.1f} s ({len(results)} of {Hyper.no_seeds} seeds)")
+
+
+def print_summary(summary):
+    print(f"Over {summary['no_seeds']} seeds, final reward {summary['reward']:.2f} +/- {summary['reward_ci']:.2f}, "
+          f"win rate {summary['win_rate'] * 100:.1f}% +/- {summary['win_rate_ci'] * 100:.1f}% (95% confidence)")
@@ -0,0 +1,91 @@
+import numpy as np
+from layouts import get_reachable
+
+# The optimal Q table of the grid without the ghost, worked out from the model of the grid
+# rather than learnt from episodes.
+# The model is the one Pacman_grid.step follows: an action moves the agent to the next cell,
+# or leaves it where it is with the obstacle reward if that cell is an obstacle. Moving onto
+# a breadcrumb not yet eaten gives the breadcrumb reward, and moving off one eats it, which
+# sets its bit in the state space index (the mask of the breadcrumbs eaten). The episode
+# ends once every breadcrumb is eaten.
+# A mask only ever gains bits, so the masks are solved in layers of the number of breadcrumbs
+# eaten, from the most to none. Within a layer an action either keeps the mask, when the
+# values are iterated to convergence for all of the masks of the layer at once, or eats a
+# breadcrumb and leads to a mask of the layer above, which is already solved.
+# Only the masks of the breadcrumbs that can be reached from the start are swept, the other
+# rows of the Q table are left at zero.
+
+
+def get_popcounts(masks, no_bits):
+    popcounts = np.zeros(len(masks), dtype=np.int64)
+    for bit in range(no_bits):
+        popcounts += (masks >> bit) & 1
+    return popcounts
+
+
+def plan_Q_values(pacman_grid, tolerance=None, max_iterations=None):
+    # Returns the Q values, shape (no_cells, 2**no_breadcrumbs, 4)
+    config = pacman_grid.config
+    if config.is_ghost:
+        raise ValueError("The planner is for the grid without the ghost, set Hyper.is_ghost = False")
+    tolerance = config.plan_tolerance if tolerance is None else tolerance
+    max_iterations = config.plan_max_iterations if max_iterations is None else max_iterations
+    tables = pacman_grid.tables
+    gamma = config.gamma
+    no_cells = tables.no_cells
+    no_breadcrumbs = tables.no_breadcrumbs
+    full_mask = (1 << no_breadcrumbs) - 1
+    cell_ids = np.arange(no_cells)
+    move_cells = tables.move_cells
+    breadcrumb_bits = tables.breadcrumb_bits
+    is_blocked = tables.is_obstacle[move_cells]
+    # Where the agent is after each action when nothing is eaten
+    next_cells = np.where(is_blocked, cell_ids[:, None], move_cells)
+
+    is_reached = get_reachable(pacman_grid.env_dict, tables.is_obstacle, tables.start_cell_id)
+    reachable_bits = int(np.bitwise_or.reduce(breadcrumb_bits[is_reached]))
+    masks = np.arange(1 << no_breadcrumbs, dtype=np.int64)
+    masks = masks[(masks & ~reachable_bits) == 0]
+    popcounts = get_popcounts(masks, no_breadcrumbs)
+
+    values = np.zeros((1 << no_breadcrumbs, no_cells), dtype=np.float64)
+    Q_values = np.zeros((no_cells, 1 << no_breadcrumbs, 4), dtype=np.float64)
+    for no_eaten in range(no_breadcrumbs - 1, -1, -1):
+        layer_masks = masks[popcounts == no_eaten]
+        if len(layer_masks) == 0:
+            continue
+        m = layer_masks[:, None, None]
+        # The reward of each (mask, cell, action)
+        new_bits = breadcrumb_bits[move_cells][None, :, :]
+        is_breadcrumb = ~is_blocked[None, :, :] & (new_bits != 0) & (m & new_bits == 0)
+        rewards = np.where(is_breadcrumb, tables.breadcrumb_reward, tables.cell_rewards[move_cells][None, :, :])
+        # Moving off a breadcrumb not yet eaten eats it
+        cell_bits = breadcrumb_bits[None, :, None]
+        is_eaten = ~is_blocked[None, :, :] & (cell_bits != 0) & (m & cell_bits == 0)
+        eaten_masks = m | np.where(is_eaten, cell_bits, 0)
+        # The actions that eat a breadcrumb lead to the solved layer above, or end the episode
+        targets = rewards + np.where(is_eaten & (eaten_masks != full_mask), gamma * values[eaten_masks, next_cells[None, :, :]], 0.0)
+        # The other actions stay in this layer
+        layer_idx = np.broadcast_to(np.arange(len(layer_masks))[:, None, None], is_eaten.shape)
+        next_cell_idx = np.broadcast_to(next_cells[None, :, :], is_eaten.shape)
+        layer_values = np.zeros((len(layer_masks), no_cells), dtype=np.float64)
+        for _ in range(max_iterations):
+            layer_Q = np.where(is_eaten, targets, targets + gamma * layer_values[layer_idx, next_cell_idx])
+            new_layer_values = layer_Q.max(axis=2)
+            change = np.abs(new_layer_values - layer_values).max()
+            layer_values = new_layer_values
+            if change < tolerance:
+                break
+        layer_Q = np.where(is_eaten, targets, targets + gamma * layer_values[layer_idx, next_cell_idx])
+        values[layer_masks] = layer_Q.max(axis=2)
+        Q_values[:, layer_masks, :] = layer_Q.transpose(1, 0, 2)
+    return Q_values
+
+
+def warm_start(pacman_grid, Q_values):
+    # Write the planned Q values into the Q table of pacman_grid, for the rows that were planned
+    Q_table = pacman_grid.Q.Q_table
+    cell_ids, indexes = np.nonzero(np.any(Q_values != 0, axis=2))
+    for action in range(Q_values.shape[2]):
+        actions = np.full(len(cell_ids), action, dtype=np.int64)
+        Q_table.set_values(cell_ids, indexes, actions, Q_values[cell_ids, indexes, action])
@@ -1,39 +1,42 @@
 
-import random
 import numpy as np
-from config import Hyper, Constants
+from config import Constants, get_config
 class Policy():
     
-    def __init__(self):
-        self.epsilon = Hyper.init_epsilon
+    def __init__(self, rng, config=None):
+        self.config = get_config() if config is None else config
+        self.epsilon = self.config.init_epsilon
+        self.exploration = rng.exploration
         
     def get(self, cell_id, Q):
         # Sample an action from the policy, given a state
         # The action returned here is the numerical representation
-        is_greedy = random.random() > self.epsilon
+        # Every random draw is a single uniform from the exploration stream (see random_streams.py)
+        # so that the batched environment in batch_grid.py consumes the stream in the same order
+        is_greedy = self.exploration.random() > self.epsilon
         if is_greedy:
             action = Q.get_action_for_max_q(cell_id)
         else:
-            action = random.randint(0, 3)
+            action = int(self.exploration.random() * 4)
         
         return action
 
     # This method is the same as the above get method EXCEPT
     # one of the available actions might be ghost instead of one of (up, down, left, right)
     def get_with_available_actions(self, cell_id, Q, available_actions):
-        is_greedy = random.random() > self.epsilon
+        is_greedy = self.exploration.random() > self.epsilon
         if is_greedy:
             action = Q.get_available_action_for_max_q(cell_id, available_actions)
         else:
-            action = random.choice(available_actions)
+            action = available_actions[int(self.exploration.random() * len(available_actions))]
         
         return action
 
 
     def update_epsilon(self):
         # called for each episode
-        if self.epsilon > Hyper.epsilon_threshold:
-            self.epsilon *= Hyper.decay
+        if self.epsilon > self.config.epsilon_threshold:
+            self.epsilon *= self.config.decay
 
         return self.epsilon
         
\ No newline at end of file
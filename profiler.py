@@ -0,0 +1,115 @@
+import time
+import cProfile
+
+# Timings of the phases of a training step, turned on with Hyper.profile.
+# The phase methods of the grid, policy and Q_learn are wrapped on the instances,
+# so nothing is added to the step when profiling is off.
+# The calls and time of each phase are added up per block of Hyper.profile_block_episodes
+# episodes, and print_summary shows how the time of the loop splits between them.
+# The time not in any phase (the step itself, reset, update_epsilon and saving the
+# episode stats) is shown as "other".
+# With Hyper.profile_path the loop is also run under cProfile and written to
+# <profile_path>.pstats, which can be read with pstats or snakeviz, and the phase
+# timings to <profile_path>.folded in the collapsed stack format of flamegraph.pl
+# and speedscope. cProfile slows the loop down, which shows in the phase timings.
+
+# The phases, as (attribute of the Pacman_grid holding the method, or None for the grid itself, method name)
+PHASES = [
+    (None, "move_ghost"),
+    (None, "get_available_actions_including_ghost"),
+    ("policy", "get"),
+    ("policy", "get_with_available_actions"),
+    ("Q", "update"),
+    (None, "agent_step")]
+
+
+class Phase_profiler:
+    def __init__(self, pacman_grid, block_episodes, path=None):
+        self.grid = pacman_grid
+        self.block_episodes = block_episodes
+        self.path = path
+        self.names = [name for _, name in PHASES]
+        self.calls = [0] * len(PHASES)
+        self.ns = [0] * len(PHASES)
+        # The totals of each block, as (episodes, loop ns, calls, ns)
+        self.blocks = []
+        self.cprofile = cProfile.Profile() if path else None
+        for phase, (attribute, name) in enumerate(PHASES):
+            owner = pacman_grid if attribute is None else getattr(pacman_grid, attribute)
+            self.wrap(owner, name, phase)
+
+    def wrap(self, owner, name, phase):
+        method = getattr(owner, name)
+        calls = self.calls
+        ns = self.ns
+        perf_counter_ns = time.perf_counter_ns
+
+        def timed(*args):
+            start = perf_counter_ns()
+            result = method(*args)
+            ns[phase] += perf_counter_ns() - start
+            calls[phase] += 1
+            return result
+        setattr(owner, name, timed)
+
+    def start(self):
+        self.block_start = time.perf_counter_ns()
+        self.block_calls = list(self.calls)
+        self.block_ns = list(self.ns)
+        self.block_first_episode = None
+        if self.cprofile:
+            self.cprofile.enable()
+
+    def end_episode(self, episodes):
+        # Called after each episode with the number of episodes completed
+        if self.block_first_episode is None:
+            self.block_first_episode = episodes
+        if episodes % self.block_episodes == 0:
+            self.end_block(episodes)
+
+    def end_block(self, episodes):
+        if self.block_first_episode is None:
+            return
+        now = time.perf_counter_ns()
+        calls = [total - start for total, start in zip(self.calls, self.block_calls)]
+        ns = [total - start for total, start in zip(self.ns, self.block_ns)]
+        self.blocks.append((episodes, now - self.block_start, calls, ns))
+        self.block_start = now
+        self.block_calls = list(self.calls)
+        self.block_ns = list(self.ns)
+        self.block_first_episode = None
+
+    def stop(self, episodes):
+        self.end_block(episodes)
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.path + ".pstats")
+            self.write_folded(self.path + ".folded")
+
+    def get_loop_ns(self):
+        return sum(block[1] for block in self.blocks)
+
+    def print_summary(self):
+        loop_ns = max(self.get_loop_ns(), 1)
+        other_ns = loop_ns - sum(self.ns)
+        print(f"Time per phase of the training loop, {loop_ns / 1e9:.3f} s in total")
+        print(f"{'phase':<40}{'calls':>12}{'seconds':>12}{'%':>8}{'ns/call':>10}")
+        for name, calls, ns in zip(self.names, self.calls, self.ns):
+            if calls > 0:
+                print(f"{name:<40}{calls:>12}{ns / 1e9:>12.3f}{100 * ns / loop_ns:>8.1f}{ns / calls:>10.0f}")
+        print(f"{'other':<40}{'':>12}{other_ns / 1e9:>12.3f}{100 * other_ns / loop_ns:>8.1f}")
+        print("Seconds per phase for each block of episodes")
+        header = "".join(f"{name[:10]:>12}" for name, calls in zip(self.names, self.calls) if calls > 0)
+        print(f"{'episodes':>10}{'loop':>10}{header}")
+        for episodes, block_loop_ns, block_calls, block_ns in self.blocks:
+            line = "".join(f"{ns / 1e9:>12.3f}" for ns, calls in zip(block_ns, self.calls) if calls > 0)
+            print(f"{episodes:>10}{block_loop_ns / 1e9:>10.3f}{line}")
+
+    def write_folded(self, filename):
+        # One line per phase, "train;<phase> <microseconds>"
+        other_ns = self.get_loop_ns() - sum(self.ns)
+        with open(filename, "w") as f:
+            for name, ns in zip(self.names, self.ns):
+                if ns > 0:
+                    f.write(f"train;{name} {ns // 1000}\n")
+            f.write(f"train;other {max(other_ns, 0) // 1000}\n")
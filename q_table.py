@@ -0,0 +1,333 @@
+import os
+import numpy as np
+from config import get_config
+
+
+# Storage for the Q table of Q_learn.
+# The Q table is indexed by (cell id, state space index, action). Q_learn and Batch_grid
+# only read and write it through the methods below, so the dense array can be swapped
+# for the sparse table when the number of breadcrumbs makes the dense array too large.
+#
+#   get_row(cell_id, index)                     the Q values of all actions (do not write to it)
+#   get(cell_id, index, action)                 one Q value
+#   set(cell_id, index, action, value)          write one Q value
+#   get_rows(cell_ids, indexes)                 batched get_row, shape (B, no_actions)
+#   get_values(cell_ids, indexes, actions)      batched get
+#   set_values(cell_ids, indexes, actions, values)  batched set, the last duplicate wins
+#   nbytes                                      memory used by the table
+#   save(directory), load(directory)            write the table to .npy files, and memory map it back
+#
+# config.q_dtype (Hyper.q_dtype by default) sets the precision of the stored values: float64, float32, float16, or int16
+# holding the Q value in steps of config.q_int16_step (see Scaled_Q_table).
+
+# The NumPy dtype stored for each Hyper.q_dtype
+Q_DTYPES = {"float64": np.float64, "float32": np.float32, "float16": np.float16, "int16": np.int16}
+
+
+def create_Q_table(no_cells, no_indexes, no_actions, config=None):
+    if config is None:
+        config = get_config()
+    if config.q_dtype not in Q_DTYPES:
+        raise ValueError(f"Unknown Q table dtype {config.q_dtype}, expected one of {', '.join(Q_DTYPES)}")
+    dtype = Q_DTYPES[config.q_dtype]
+    if config.q_table == "dense":
+        check_memory(no_cells * no_indexes * no_actions * np.dtype(dtype).itemsize, config)
+        Q_table = Dense_Q_table(no_cells, no_indexes, no_actions, dtype)
+    elif config.q_table == "sparse":
+        Q_table = Sparse_Q_table(no_cells, no_indexes, no_actions, dtype=dtype)
+    else:
+        raise ValueError(f"Unknown Q table storage {config.q_table}, expected dense or sparse")
+    if config.q_dtype == "int16":
+        return Scaled_Q_table(Q_table, config.q_int16_step)
+    return Q_table
+
+
+def get_available_memory():
+    # The physical memory available for a new table in bytes, or None where it cannot be found.
+    # On Linux this is MemAvailable, which counts the page cache that can be reclaimed,
+    # elsewhere the free pages.
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def check_memory(nbytes, config):
+    # Pre-flight check before allocating a dense table of nbytes.
+    # config.q_memory_check is "error" to refuse a table larger than config.q_memory_fraction of
+    # the free memory, "warn" to only print a warning, or "off".
+    if config.q_memory_check == "off":
+        return
+    available = get_available_memory()
+    if available is None or nbytes <= config.q_memory_fraction * available:
+        return
+    message = (f"The dense Q table needs {nbytes / 2**30:.2f} GB and {available / 2**30:.2f} GB of memory is available. "
+               f"Use fewer breadcrumbs, a smaller Hyper.q_dtype or Hyper.q_table = \"sparse\"")
+    if config.q_memory_check == "error":
+        raise MemoryError(message)
+    print(f"Warning: {message}")
+
+
+class Dense_Q_table:
+    # Every (cell id, state space index) pair gets a row of actions up front
+    def __init__(self, no_cells, no_indexes, no_actions, dtype=np.float64):
+        self.shape = (no_cells, no_indexes, no_actions)
+        self.values = np.zeros(self.shape, dtype=dtype)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    @property
+    def no_rows(self):
+        return self.shape[0] * self.shape[1]
+
+    def get_row(self, cell_id, index):
+        return self.values[cell_id, index]
+
+    def get(self, cell_id, index, action):
+        return self.values[cell_id, index, action]
+
+    def set(self, cell_id, index, action, value):
+        self.values[cell_id, index, action] = value
+
+    def get_rows(self, cell_ids, indexes):
+        return self.values[cell_ids, indexes]
+
+    def get_values(self, cell_ids, indexes, actions):
+        return self.values[cell_ids, indexes, actions]
+
+    def set_values(self, cell_ids, indexes, actions, values):
+        self.values[cell_ids, indexes, actions] = values
+
+    def to_dense(self):
+        return self.values
+
+    def save(self, directory):
+        np.save(os.path.join(directory, "Q_table.npy"), self.values)
+
+    def load(self, directory):
+        # Copy on write memory map, the file is read lazily as the table is used and
+        # the updates made during training never go back to the file
+        values = np.load(os.path.join(directory, "Q_table.npy"), mmap_mode="c")
+        if values.shape != self.shape:
+            raise ValueError(f"The saved Q table has shape {values.shape}, expected {self.shape}")
+        if values.dtype != self.values.dtype:
+            raise ValueError(f"The saved Q table has dtype {values.dtype}, expected {self.values.dtype}")
+        self.values = values
+
+
+class Sparse_Q_table:
+    # Only (cell id, state space index) pairs that have been written to get a row of actions.
+    # Unvisited pairs read as zeros, the same as the dense table.
+    # The pair is packed into the key cell_id * no_indexes + index and looked up in an
+    # open addressing hash table (linear probing) held in two NumPy arrays:
+    # slot_keys holds the key in each slot (-1 for an empty slot) and slot_rows the row
+    # of the key in the rows array. The hash table is kept at most half full.
+    EMPTY_KEY = -1
+    HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+    def __init__(self, no_cells, no_indexes, no_actions, capacity=1024, dtype=np.float64):
+        self.shape = (no_cells, no_indexes, no_actions)
+        self.no_indexes = no_indexes
+        self.no_rows = 0
+        self.rows = np.zeros((capacity // 2, no_actions), dtype=dtype)
+        self.row_keys = np.zeros(capacity // 2, dtype=np.int64)
+        self.zero_row = np.zeros(no_actions, dtype=dtype)
+        self.zero_row.flags.writeable = False
+        self.setup_slots(capacity)
+
+    def setup_slots(self, capacity):
+        # capacity must be a power of 2 so that the hash can be masked into a slot
+        self.capacity = capacity
+        self.slot_mask = capacity - 1
+        self.hash_shift = 64 - (capacity.bit_length() - 1)
+        self.slot_keys = np.full(capacity, self.EMPTY_KEY, dtype=np.int64)
+        self.slot_rows = np.zeros(capacity, dtype=np.int64)
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + self.row_keys.nbytes + self.slot_keys.nbytes + self.slot_rows.nbytes
+
+    def get_slot(self, key):
+        # Fibonacci hashing, the top bits of key * 2**64 / golden ratio
+        return ((key * self.HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> self.hash_shift
+
+    def get_slots(self, keys):
+        # Batched get_slot, the uint64 multiplication wraps around the same way
+        return ((keys.astype(np.uint64) * np.uint64(self.HASH_MULTIPLIER)) >> np.uint64(self.hash_shift)).astype(np.int64)
+
+    def find_row(self, cell_id, index):
+        key = cell_id * self.no_indexes + index
+        slot = self.get_slot(int(key))
+        while True:
+            slot_key = self.slot_keys[slot]
+            if slot_key == key:
+                return self.slot_rows[slot]
+            if slot_key == self.EMPTY_KEY:
+                return -1
+            slot = (slot + 1) & self.slot_mask
+
+    def find_rows(self, keys):
+        # Batched find_row, probing all of the keys at once
+        slots = self.get_slots(keys)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        pending = np.arange(len(keys))
+        while len(pending) > 0:
+            slot_keys = self.slot_keys[slots[pending]]
+            is_found = slot_keys == keys[pending]
+            rows[pending[is_found]] = self.slot_rows[slots[pending[is_found]]]
+            pending = pending[~is_found & (slot_keys != self.EMPTY_KEY)]
+            slots[pending] = (slots[pending] + 1) & self.slot_mask
+        return rows
+
+    def insert_keys(self, keys):
+        # Add rows for keys that are not in the table yet. The keys must be unique.
+        no_rows = self.no_rows + len(keys)
+        if no_rows > len(self.rows):
+            size = max(no_rows, 2 * len(self.rows))
+            self.rows = np.concatenate((self.rows, np.zeros((size - len(self.rows), self.shape[2]), dtype=self.rows.dtype)))
+            self.row_keys = np.concatenate((self.row_keys, np.zeros(size - len(self.row_keys), dtype=np.int64)))
+        new_rows = np.arange(self.no_rows, no_rows)
+        self.row_keys[new_rows] = keys
+        self.no_rows = no_rows
+        if 2 * no_rows > self.capacity:
+            # Rehash every key into a table twice the size
+            capacity = self.capacity
+            while 2 * no_rows > capacity:
+                capacity *= 2
+            self.setup_slots(capacity)
+            self.place_keys(self.row_keys[:no_rows], np.arange(no_rows))
+        else:
+            self.place_keys(keys, new_rows)
+
+    def place_keys(self, keys, rows):
+        slots = self.get_slots(keys)
+        pending = np.arange(len(keys))
+        while len(pending) > 0:
+            is_empty = self.slot_keys[slots[pending]] == self.EMPTY_KEY
+            candidates = pending[is_empty]
+            # When several keys probe the same empty slot, the first one takes it
+            _, first = np.unique(slots[candidates], return_index=True)
+            placed = candidates[first]
+            self.slot_keys[slots[placed]] = keys[placed]
+            self.slot_rows[slots[placed]] = rows[placed]
+            pending = np.setdiff1d(pending, placed, assume_unique=True)
+            slots[pending] = (slots[pending] + 1) & self.slot_mask
+
+    def get_row(self, cell_id, index):
+        row = self.find_row(cell_id, index)
+        if row < 0:
+            return self.zero_row
+        return self.rows[row]
+
+    def get(self, cell_id, index, action):
+        return self.get_row(cell_id, index)[action]
+
+    def set(self, cell_id, index, action, value):
+        row = self.find_row(cell_id, index)
+        if row < 0:
+            row = self.no_rows
+            self.insert_keys(np.array([cell_id * self.no_indexes + index], dtype=np.int64))
+        self.rows[row, action] = value
+
+    def get_rows(self, cell_ids, indexes):
+        rows = self.find_rows(cell_ids * self.no_indexes + indexes)
+        return np.where((rows >= 0)[:, None], self.rows[np.maximum(rows, 0)], 0)
+
+    def get_values(self, cell_ids, indexes, actions):
+        rows = self.find_rows(cell_ids * self.no_indexes + indexes)
+        return np.where(rows >= 0, self.rows[np.maximum(rows, 0), actions], 0)
+
+    def set_values(self, cell_ids, indexes, actions, values):
+        keys = cell_ids * self.no_indexes + indexes
+        rows = self.find_rows(keys)
+        is_missing = rows < 0
+        if is_missing.any():
+            self.insert_keys(np.unique(keys[is_missing]))
+            rows[is_missing] = self.find_rows(keys[is_missing])
+        self.rows[rows, actions] = values
+
+    def to_dense(self):
+        values = np.zeros(self.shape, dtype=self.rows.dtype)
+        keys = self.row_keys[:self.no_rows]
+        values[keys // self.no_indexes, keys % self.no_indexes] = self.rows[:self.no_rows]
+        return values
+
+    def save(self, directory):
+        np.save(os.path.join(directory, "Q_rows.npy"), self.rows[:self.no_rows])
+        np.save(os.path.join(directory, "Q_keys.npy"), self.row_keys[:self.no_rows])
+
+    def load(self, directory):
+        # The rows are memory mapped copy on write, only the hash table is rebuilt in memory
+        rows = np.load(os.path.join(directory, "Q_rows.npy"), mmap_mode="c")
+        if rows.shape[1] != self.shape[2]:
+            raise ValueError(f"The saved Q table has {rows.shape[1]} actions, expected {self.shape[2]}")
+        if rows.dtype != self.rows.dtype:
+            raise ValueError(f"The saved Q table has dtype {rows.dtype}, expected {self.rows.dtype}")
+        self.rows = rows
+        self.row_keys = np.load(os.path.join(directory, "Q_keys.npy"))
+        self.no_rows = len(self.row_keys)
+        capacity = 1024
+        while 2 * self.no_rows > capacity:
+            capacity *= 2
+        self.setup_slots(capacity)
+        self.place_keys(self.row_keys, np.arange(self.no_rows))
+
+
+class Scaled_Q_table:
+    # Q values held as int16 multiples of step in a dense or sparse table.
+    # A value is rounded to the nearest step when written and clipped to the int16 range,
+    # so the table covers +/- 32767 * step, and a change to a Q value smaller than half a
+    # step is lost. The get methods return float64 values.
+    INT16_MAX = 32767
+
+    def __init__(self, Q_table, step):
+        self.Q_table = Q_table
+        self.step = step
+        self.shape = Q_table.shape
+
+    @property
+    def nbytes(self):
+        return self.Q_table.nbytes
+
+    @property
+    def no_rows(self):
+        return self.Q_table.no_rows
+
+    def quantize(self, values):
+        return np.clip(np.rint(np.asarray(values) / self.step), -self.INT16_MAX, self.INT16_MAX).astype(np.int16)
+
+    def get_row(self, cell_id, index):
+        return self.Q_table.get_row(cell_id, index) * self.step
+
+    def get(self, cell_id, index, action):
+        return float(self.Q_table.get(cell_id, index, action)) * self.step
+
+    def set(self, cell_id, index, action, value):
+        self.Q_table.set(cell_id, index, action, self.quantize(value))
+
+    def get_rows(self, cell_ids, indexes):
+        return self.Q_table.get_rows(cell_ids, indexes) * self.step
+
+    def get_values(self, cell_ids, indexes, actions):
+        return self.Q_table.get_values(cell_ids, indexes, actions) * self.step
+
+    def set_values(self, cell_ids, indexes, actions, values):
+        self.Q_table.set_values(cell_ids, indexes, actions, self.quantize(values))
+
+    def to_dense(self):
+        return self.Q_table.to_dense() * self.step
+
+    def save(self, directory):
+        self.Q_table.save(directory)
+
+    def load(self, directory):
+        self.Q_table.load(directory)
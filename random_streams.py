@@ -0,0 +1,133 @@
+import numpy as np
+
+# The random numbers of one Pacman_grid.
+# Every grid owns its generators, spawned from one seed (config.seed of the grid) with
+# numpy's SeedSequence, so a run is reproducible from that seed and grids in other
+# processes never share a stream. Each use has its own stream, so for example a change
+# to how the ghost moves does not change the exploration of the agent:
+#
+#   exploration     whether a step is greedy, and the random action when it is not
+#   tie_break       which of the actions with the maximum Q value is taken
+#   ghost           where the ghost starts and how it moves
+#   layout          the random breadcrumb cells (a Generator)
+#   kernel          the seeds of the blocks of episodes run by jit_grid.py (a Generator)
+#   replay          the transitions sampled from the replay buffer (a Generator)
+#
+# The uniform streams are drawn from their Generator in blocks of config.rng_block_size
+# and handed out one at a time, which costs less than a call into NumPy per draw.
+
+UNIFORM_STREAMS = ["exploration", "tie_break", "ghost"]
+GENERATORS = ["layout", "kernel", "replay"]
+
+
+class Uniform_stream:
+    def __init__(self, generator, block_size):
+        self.generator = generator
+        self.block_size = block_size
+        self.values = np.zeros(0, dtype=np.float64)
+        self.list = []
+        self.pos = 0
+
+    def refill(self):
+        self.values = self.generator.random(self.block_size)
+        self.list = self.values.tolist()
+        self.pos = 0
+
+    def random(self):
+        # The next uniform in [0, 1)
+        if self.pos == len(self.list):
+            self.refill()
+        uniform = self.list[self.pos]
+        self.pos += 1
+        return uniform
+
+    def random_array(self, size):
+        # The next size uniforms, in the same order as size calls to random
+        parts = []
+        while size > 0:
+            if self.pos == len(self.list):
+                self.refill()
+            no_taken = min(size, len(self.list) - self.pos)
+            parts.append(self.values[self.pos:self.pos + no_taken])
+            self.pos += no_taken
+            size -= no_taken
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float64)
+
+    def get_state(self):
+        # The generator state and the uniforms drawn but not handed out yet
+        return {"generator": self.generator.bit_generator.state, "remaining": self.list[self.pos:]}
+
+    def set_state(self, state):
+        self.generator.bit_generator.state = state["generator"]
+        self.values = np.array(state["remaining"], dtype=np.float64)
+        self.list = self.values.tolist()
+        self.pos = 0
+
+
+class Random_streams:
+    def __init__(self, seed, block_size):
+        self.seed = seed
+        # The streams are spawned in a fixed order, a new stream must go on the end
+        # so that the existing ones keep their numbers
+        seed_sequences = np.random.SeedSequence(self.seed).spawn(len(UNIFORM_STREAMS) + len(GENERATORS))
+        generators = [np.random.Generator(np.random.PCG64(seed_sequence)) for seed_sequence in seed_sequences]
+        for name, generator in zip(UNIFORM_STREAMS, generators):
+            setattr(self, name, Uniform_stream(generator, block_size))
+        for name, generator in zip(GENERATORS, generators[len(UNIFORM_STREAMS):]):
+            setattr(self, name, generator)
+
+    def get_state(self):
+        # A dictionary of plain values that can be written as JSON, for a checkpoint
+        state = {name: getattr(self, name).get_state() for name in UNIFORM_STREAMS}
+        for name in GENERATORS:
+            state[name] = getattr(self, name).bit_generator.state
+        return state
+
+    def set_state(self, state):
+        for name in UNIFORM_STREAMS:
+            getattr(self, name).set_state(state[name])
+        for name in GENERATORS:
+            # A checkpoint saved before a stream was added leaves it as seeded
+            if name in state:
+                getattr(self, name).bit_generator.state = state[name]
+
+
+class Stacked_uniform_stream:
+    # The same stream of several grids side by side, as used by Config_batch.
+    # Row k hands out the uniforms of streams[k] in the same order as streams[k].random,
+    # each row refilling its block from its own Generator, so a row draws the numbers its
+    # grid would have drawn on its own. sync writes the position of each row back to its stream.
+    def __init__(self, streams):
+        self.streams = streams
+        self.block_size = max(stream.block_size for stream in streams)
+        self.values = np.zeros((len(streams), self.block_size), dtype=np.float64)
+        self.lengths = np.zeros(len(streams), dtype=np.int64)
+        self.pos = np.zeros(len(streams), dtype=np.int64)
+        for k, stream in enumerate(streams):
+            # Carry on from the uniforms drawn but not handed out yet
+            self.set_row(k, stream.values[stream.pos:])
+
+    def set_row(self, k, values):
+        if len(values) > self.block_size:
+            self.values = np.concatenate((self.values, np.zeros((len(self.streams), len(values) - self.block_size))), axis=1)
+            self.block_size = len(values)
+        self.values[k, :len(values)] = values
+        self.lengths[k] = len(values)
+        self.pos[k] = 0
+
+    def random(self, rows):
+        # The next uniform of each of rows, which must not repeat
+        for k in rows[self.pos[rows] == self.lengths[rows]].tolist():
+            stream = self.streams[k]
+            self.set_row(k, stream.generator.random(stream.block_size))
+        uniforms = self.values[rows, self.pos[rows]]
+        self.pos[rows] += 1
+        return uniforms
+
+    def sync(self):
+        for k, stream in enumerate(self.streams):
+            stream.values = self.values[k, self.pos[k]:self.lengths[k]].copy()
+            stream.list = stream.values.tolist()
+            stream.pos = 0
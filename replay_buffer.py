@@ -0,0 +1,175 @@
+import os
+import numpy as np
+from config import get_config
+
+# Experience replay for Q learning, turned on with Hyper.replay.
+# Every step of the agent is stored as a transition (old cell, mask, action, reward,
+# new cell, new mask, done) in a ring of Hyper.replay_capacity transitions, held in NumPy
+# arrays allocated up front, so the memory used is fixed and the newest transition
+# overwrites the oldest once the ring is full. The mask is the bitmask of the breadcrumbs
+# eaten, which is the state space index of the Q table. done is set when the episode ended
+# with the ghost or the last breadcrumb, where the update does not look ahead; an episode
+# cut short by the time step limit is not done.
+# For every step Hyper.replay_ratio transitions are replayed, in minibatches of
+# Hyper.replay_batch_size through one batched TD update, as Batch_grid.update. If several
+# transitions of a minibatch update the same entry, the last one wins.
+# Uniform sampling costs O(1) per transition. With Hyper.replay_prioritized the transitions
+# are sampled in proportion to (|TD error| + replay_priority_epsilon) ** replay_priority_alpha,
+# held in a sum tree, so an insert or a sample costs O(log capacity), and the step of each
+# update is scaled by its importance sampling weight with exponent replay_priority_beta.
+# A new transition gets the largest priority so far, so it is replayed at least once.
+# The samples are drawn from the replay stream of the grid (see random_streams.py).
+
+
+class Replay_buffer:
+    def __init__(self, rng, config=None):
+        self.rng = rng
+        self.config = get_config() if config is None else config
+        self.capacity = self.config.replay_capacity
+        self.prioritized = self.config.replay_prioritized
+        self.old_cell_ids = np.zeros(self.capacity, dtype=np.int32)
+        self.old_indexes = np.zeros(self.capacity, dtype=np.int64)
+        self.actions = np.zeros(self.capacity, dtype=np.int8)
+        self.rewards = np.zeros(self.capacity, dtype=np.int32)
+        self.new_cell_ids = np.zeros(self.capacity, dtype=np.int32)
+        self.new_indexes = np.zeros(self.capacity, dtype=np.int64)
+        self.done = np.zeros(self.capacity, dtype=bool)
+        # The next slot to write and the number of transitions held
+        self.pos = 0
+        self.size = 0
+        # The transitions owed to the replay, taken a minibatch at a time
+        self.credit = 0.0
+        if self.prioritized:
+            # Sum tree of the priorities, node i holds the sum of nodes 2i and 2i + 1
+            # and the leaves start at tree_capacity
+            self.tree_capacity = 1
+            while self.tree_capacity < self.capacity:
+                self.tree_capacity *= 2
+            self.tree = np.zeros(2 * self.tree_capacity, dtype=np.float64)
+            self.max_priority = 1.0
+
+    @property
+    def nbytes(self):
+        arrays = [self.old_cell_ids, self.old_indexes, self.actions, self.rewards, self.new_cell_ids, self.new_indexes, self.done]
+        if self.prioritized:
+            arrays.append(self.tree)
+        return sum(array.nbytes for array in arrays)
+
+    def add(self, old_cell_id, old_index, action, reward, new_cell_id, new_index, done):
+        pos = self.pos
+        self.old_cell_ids[pos] = old_cell_id
+        self.old_indexes[pos] = old_index
+        self.actions[pos] = action
+        self.rewards[pos] = reward
+        self.new_cell_ids[pos] = new_cell_id
+        self.new_indexes[pos] = new_index
+        self.done[pos] = done
+        if self.prioritized:
+            self.set_priority(pos, self.max_priority)
+        self.pos = (pos + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.credit += self.config.replay_ratio
+
+    def add_batch(self, old_cell_ids, old_indexes, actions, rewards, new_cell_ids, new_indexes, done):
+        # Batched add, in the order of the rows
+        no_added = len(old_cell_ids)
+        positions = (self.pos + np.arange(no_added)) % self.capacity
+        # With more rows than the capacity only the last of them are kept
+        keep = slice(max(no_added - self.capacity, 0), no_added)
+        positions = positions[keep]
+        self.old_cell_ids[positions] = old_cell_ids[keep]
+        self.old_indexes[positions] = old_indexes[keep]
+        self.actions[positions] = actions[keep]
+        self.rewards[positions] = rewards[keep]
+        self.new_cell_ids[positions] = new_cell_ids[keep]
+        self.new_indexes[positions] = new_indexes[keep]
+        self.done[positions] = done[keep]
+        if self.prioritized:
+            self.set_priorities(positions, np.full(len(positions), self.max_priority))
+        self.pos = (self.pos + no_added) % self.capacity
+        self.size = min(self.size + no_added, self.capacity)
+        self.credit += self.config.replay_ratio * no_added
+
+    def set_priority(self, pos, priority):
+        node = self.tree_capacity + pos
+        self.tree[node] = priority
+        node //= 2
+        while node >= 1:
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+            node //= 2
+
+    def set_priorities(self, positions, priorities):
+        # Batched set_priority, a parent shared by several leaves is summed once per level
+        nodes = self.tree_capacity + positions
+        self.tree[nodes] = priorities
+        while nodes[0] > 1:
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def sample(self, batch_size):
+        # The positions of batch_size transitions and the step weight of each
+        if not self.prioritized:
+            return self.rng.integers(0, self.size, batch_size), np.ones(batch_size)
+        # Walk down the sum tree from the root, a level at a time for the whole batch
+        targets = self.rng.random(batch_size) * self.tree[1]
+        nodes = np.ones(batch_size, dtype=np.int64)
+        while nodes[0] < self.tree_capacity:
+            left = 2 * nodes
+            left_sums = self.tree[left]
+            # Rounding can leave a target past the last leaf, it stays on the left then
+            is_right = (targets >= left_sums) & (self.tree[left + 1] > 0)
+            targets = np.where(is_right, targets - left_sums, targets)
+            nodes = left + is_right
+        positions = nodes - self.tree_capacity
+        probabilities = self.tree[nodes] / self.tree[1]
+        weights = (self.size * probabilities) ** -self.config.replay_priority_beta
+        return positions, weights / weights.max()
+
+    def replay(self, Q_table):
+        # Replay the minibatches owed, once there are enough transitions for one
+        batch_size = self.config.replay_batch_size
+        if self.size < batch_size:
+            return
+        while self.credit >= batch_size:
+            self.credit -= batch_size
+            self.replay_batch(Q_table, batch_size)
+
+    def replay_batch(self, Q_table, batch_size):
+        positions, weights = self.sample(batch_size)
+        old_cell_ids = self.old_cell_ids[positions].astype(np.int64)
+        old_indexes = self.old_indexes[positions]
+        actions = self.actions[positions].astype(np.int64)
+        # The update is worked out in float64 whatever config.q_dtype the table stores
+        q_old = Q_table.get_values(old_cell_ids, old_indexes, actions).astype(np.float64)
+        q_max = Q_table.get_rows(self.new_cell_ids[positions].astype(np.int64), self.new_indexes[positions]).max(axis=1).astype(np.float64)
+        targets = self.rewards[positions] + np.where(self.done[positions], 0.0, self.config.gamma * q_max)
+        td_errors = targets - q_old
+        Q_table.set_values(old_cell_ids, old_indexes, actions, q_old + self.config.alpha * weights * td_errors)
+        if self.prioritized:
+            priorities = (np.abs(td_errors) + self.config.replay_priority_epsilon) ** self.config.replay_priority_alpha
+            self.set_priorities(positions, priorities)
+            self.max_priority = max(self.max_priority, priorities.max())
+
+    def save(self, directory):
+        arrays = {"old_cell_ids": self.old_cell_ids, "old_indexes": self.old_indexes, "actions": self.actions,
+                  "rewards": self.rewards, "new_cell_ids": self.new_cell_ids, "new_indexes": self.new_indexes, "done": self.done}
+        if self.prioritized:
+            arrays["tree"] = self.tree
+            arrays["max_priority"] = self.max_priority
+        np.savez(os.path.join(directory, "replay.npz"), pos=self.pos, size=self.size, credit=self.credit, **arrays)
+
+    def load(self, directory):
+        with np.load(os.path.join(directory, "replay.npz")) as replay:
+            if len(replay["old_cell_ids"]) != self.capacity:
+                raise ValueError(f"The saved replay buffer holds {len(replay['old_cell_ids'])} transitions, expected {self.capacity}")
+            for name in ["old_cell_ids", "old_indexes", "actions", "rewards", "new_cell_ids", "new_indexes", "done"]:
+                getattr(self, name)[:] = replay[name]
+            if self.prioritized:
+                self.tree[:] = replay["tree"]
+                self.max_priority = float(replay["max_priority"])
+            self.pos = int(replay["pos"])
+            self.size = int(replay["size"])
+            self.credit = float(replay["credit"])
+
+    def get_memory_footprint(self):
+        return f"Replay buffer uses {self.nbytes / 2**20:.2f} MB for {self.size} of {self.capacity} transitions"
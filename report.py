@@ -0,0 +1,103 @@
+import multiprocessing
+import numpy as np
+from config import Constants
+from rolling_stats import get_moving_average
+
+# The figures drawn at the end of a run by Pacman_grid.print_results.
+# matplotlib and seaborn are only imported when the figures are drawn, with the
+# non-interactive Agg backend, so training and tuning never load them.
+# The settings are the config of the Pacman_grid. With config.report_in_background the
+# figures are drawn in a separate process, which is given everything it needs as arguments.
+
+
+def get_image_filename(config, name, extension=".jpg"):
+    filename = f"images/{name}_lr{config.alpha}_discount_rate{config.gamma}_bc{config.no_breadcrumbs}".replace(".","") + extension
+    if config.is_ghost:
+        filename = filename.replace("images/", "images/ghost_")
+    return filename
+
+
+def get_moving_average_rewards(rewards_per_episode, window):
+    # Average reward over the last window episodes
+    return get_moving_average(rewards_per_episode, window)
+
+
+def get_moving_average_results(won_per_episode, window):
+    # Percentage of wins and losses over the last window episodes
+    moving_average_results = np.zeros((2, len(won_per_episode)), dtype=np.float64)
+    moving_average_results[Constants.WIN_CELL] = get_moving_average(won_per_episode, window) * 100
+    moving_average_results[Constants.LOSE_CELL] = 100 - moving_average_results[Constants.WIN_CELL]
+    return moving_average_results
+
+
+def print_results(pacman_grid):
+    # Draw the figures for the episodes of pacman_grid.
+    # Returns the process drawing them with config.report_in_background, otherwise None.
+    config = pacman_grid.config
+    records = pacman_grid.metrics.read()
+    filenames = {name: get_image_filename(config, name) for name in ["hm", "rw", "rw_ma", "ts", "res"]}
+    x_label_text = f"Episode # (learning rate = {config.alpha}, discount factor = {config.gamma})"
+    args = (
+        filenames,
+        x_label_text,
+        config.no_breadcrumbs,
+        np.array(pacman_grid.env_counter),
+        records["steps"],
+        records["reward"],
+        get_moving_average_rewards(records["reward"], config.rolling_window),
+        get_moving_average_results(records["won"], config.rolling_window))
+    if not config.report_in_background:
+        draw_figures(*args)
+        return None
+    process = multiprocessing.Process(target=draw_figures, args=args)
+    process.start()
+    return process
+
+
+def draw_figures(filenames, x_label_text, no_breadcrumbs, env_counter, timesteps_per_episode,
+                 rewards_per_episode, moving_average_rewards, moving_average_results):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sn
+
+    _ = sn.heatmap(data=env_counter)
+    plt.title("Number of steps per cell")
+    plt.xlabel(x_label_text)
+    plt.savefig(filenames["hm"])
+
+    fig = plt.figure()
+    fig.add_subplot(111)
+    episodes = np.arange(1, len(timesteps_per_episode)+1)
+    plt.title(f"Number of timesteps per episode for {no_breadcrumbs} breadcrumbs")
+    plt.plot(episodes, timesteps_per_episode)
+    plt.ylabel('Steps')
+    plt.xlabel(x_label_text)
+    plt.savefig(filenames["ts"])
+
+    fig = plt.figure()
+    fig.add_subplot(111)
+    episodes = np.arange(1, len(rewards_per_episode)+1)
+    plt.title(f"Value of rewards per episode for {no_breadcrumbs} breadcrumbs")
+    plt.plot(episodes, rewards_per_episode)
+    plt.ylabel('Rewards')
+    plt.xlabel(x_label_text)
+    plt.savefig(filenames["rw"])
+
+    episodes = np.arange(len(moving_average_rewards))
+    fig = plt.figure()
+    fig.add_subplot(111)
+    plt.title(f"Moving Average rewards per hundred episodes")
+    plt.plot(episodes, moving_average_rewards, "b-")
+    plt.ylabel('Results per 100')
+    plt.xlabel(x_label_text)
+    plt.savefig(filenames["rw_ma"])
+
+    fig = plt.figure()
+    fig.add_subplot(111)
+    plt.title(f"Moving Average per hundred episodes % wins/losses: Wins in blue, losses in red")
+    plt.plot(episodes, moving_average_results[Constants.WIN_CELL], "b-", episodes, moving_average_results[Constants.LOSE_CELL], "r-")
+    plt.ylabel('Results per 100')
+    plt.xlabel(x_label_text)
+    plt.savefig(filenames["res"])
+    plt.close("all")
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+def get_moving_average(values, window):
+    # The mean of the last window values at each episode, from a cumulative sum.
+    # The first window - 1 episodes are averaged over the episodes so far.
+    cumulative = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    upper = np.arange(1, len(values) + 1)
+    lower = np.maximum(upper - window, 0)
+    return (cumulative[upper] - cumulative[lower]) / (upper - lower)
+
+
+class Rolling_stats:
+    # Statistics over the last window episodes, kept up to date in O(1) per episode.
+    # The rewards and results are held in a ring buffer, and running sums of the
+    # rewards, squared rewards and wins give the mean, variance and win/loss rates
+    # without going over the window. Quantiles are worked out from the buffer on request.
+    def __init__(self, window):
+        self.window = window
+        self.rewards = np.zeros(self.window, dtype=np.float64)
+        self.won = np.zeros(self.window, dtype=np.bool_)
+        self.no_episodes = 0
+        self.reward_sum = 0.0
+        self.reward_square_sum = 0.0
+        self.no_won = 0
+
+    @property
+    def count(self):
+        return min(self.no_episodes, self.window)
+
+    def add(self, reward, won):
+        idx = self.no_episodes % self.window
+        if self.no_episodes >= self.window:
+            # The oldest episode drops out of the window
+            old_reward = self.rewards[idx]
+            self.reward_sum -= old_reward
+            self.reward_square_sum -= old_reward * old_reward
+            self.no_won -= self.won[idx]
+        self.rewards[idx] = reward
+        self.won[idx] = won
+        self.reward_sum += reward
+        self.reward_square_sum += reward * reward
+        self.no_won += won
+        self.no_episodes += 1
+
+    def add_batch(self, rewards, won):
+        # add for the episodes in the arrays rewards and won
+        no_added = len(rewards)
+        if no_added >= self.window:
+            # Only the last window episodes are kept
+            self.no_episodes += no_added - self.window
+            rewards = rewards[-self.window:]
+            won = won[-self.window:]
+            no_added = self.window
+        positions = self.no_episodes + np.arange(no_added)
+        idx = positions % self.window
+        is_replaced = positions >= self.window
+        old_rewards = self.rewards[idx[is_replaced]]
+        self.reward_sum += np.sum(rewards, dtype=np.float64) - old_rewards.sum()
+        self.reward_square_sum += np.sum(np.square(rewards, dtype=np.float64)) - np.square(old_rewards).sum()
+        self.no_won += int(np.count_nonzero(won)) - int(np.count_nonzero(self.won[idx[is_replaced]]))
+        self.rewards[idx] = rewards
+        self.won[idx] = won
+        self.no_episodes += no_added
+
+    def get_mean(self):
+        if self.count == 0:
+            return 0.0
+        return self.reward_sum / self.count
+
+    def get_variance(self):
+        if self.count == 0:
+            return 0.0
+        mean = self.get_mean()
+        return max(self.reward_square_sum / self.count - mean * mean, 0.0)
+
+    def get_win_rate(self):
+        if self.count == 0:
+            return 0.0
+        return self.no_won / self.count
+
+    def get_loss_rate(self):
+        if self.count == 0:
+            return 0.0
+        return 1 - self.get_win_rate()
+
+    def get_quantile(self, q):
+        return np.quantile(self.rewards[:self.count], q)
@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import logging
+from logging.handlers import MemoryHandler
+import numpy as np
+
+# The log of a training run, through the standard logging module under the name "pacman".
+# Messages at Hyper.log_level and above go to the console (unless Hyper.log_console is off)
+# and, with a Hyper.log_path, are appended to that file. The file is written through a
+# buffer of Hyper.log_buffer_records records, which is flushed when it is full, on a
+# warning and at exit, so a long run does not write the file a line at a time.
+# The handlers are set up by the first get_logger in a process, from its config.
+#
+# The results of the episodes go through an Episode_log, which summarises them at most
+# once every Hyper.log_interval_seconds seconds, or every Hyper.log_interval_episodes
+# episodes if that is above 0: the mean time steps and reward, the win and caught rates,
+# epsilon and the episodes per second since the last summary. With both set to 0 every
+# episode has its own line, as before.
+
+LOGGER_NAME = "pacman"
+
+
+def get_logger(config=None):
+    logger = logging.getLogger(LOGGER_NAME)
+    if logger.handlers:
+        return logger
+    if config is None:
+        from config import get_config
+        config = get_config()
+    logger.setLevel(config.log_level)
+    logger.propagate = False
+    if config.log_console:
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(console)
+    if config.log_path:
+        directory = os.path.dirname(config.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        log_file = logging.FileHandler(config.log_path, delay=True)
+        log_file.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        logger.addHandler(MemoryHandler(config.log_buffer_records, flushLevel=logging.WARNING, target=log_file))
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    return logger
+
+
+def flush_log():
+    for handler in logging.getLogger(LOGGER_NAME).handlers:
+        handler.flush()
+
+
+class Episode_log:
+    def __init__(self, config):
+        self.logger = get_logger(config)
+        self.interval_seconds = config.log_interval_seconds
+        self.interval_episodes = config.log_interval_episodes
+        self.last_time = time.perf_counter()
+        self.clear()
+
+    def clear(self):
+        # The totals of the episodes since the last summary
+        self.no_episodes = 0
+        self.time_steps = 0
+        self.reward = 0
+        self.no_won = 0
+        self.no_caught = 0
+        self.epsilon = 0.0
+
+    def add(self, episodes, time_step, reward, epsilon, is_won, is_caught):
+        # episodes is the number of episodes completed, including this one
+        self.no_episodes += 1
+        self.time_steps += int(time_step)
+        self.reward += int(reward)
+        self.no_won += bool(is_won)
+        self.no_caught += bool(is_caught)
+        self.epsilon = float(epsilon)
+        if self.is_due():
+            self.flush(episodes, time_step, reward)
+
+    def add_batch(self, episodes, time_steps, rewards, epsilons, is_won, is_caught):
+        # Batched add, episodes is the number completed up to the last of them
+        if len(time_steps) == 0:
+            return
+        self.no_episodes += len(time_steps)
+        self.time_steps += int(np.sum(time_steps))
+        self.reward += int(np.sum(rewards))
+        self.no_won += int(np.count_nonzero(is_won))
+        self.no_caught += int(np.count_nonzero(is_caught))
+        self.epsilon = float(epsilons[-1])
+        if self.is_due():
+            self.flush(episodes, time_steps[-1], rewards[-1])
+
+    def is_due(self):
+        if self.interval_episodes > 0:
+            return self.no_episodes >= self.interval_episodes
+        return time.perf_counter() - self.last_time >= self.interval_seconds
+
+    def flush(self, episodes, time_step=None, reward=None):
+        # Log the summary of the episodes since the last one, if there are any
+        if self.no_episodes == 0:
+            return
+        now = time.perf_counter()
+        if self.no_episodes == 1 and time_step is not None:
+            self.logger.info(f"Completed environment after {episodes} episodes and {time_step} timesteps, "
+                             f"total reward: {reward} with epsilon: {self.epsilon}")
+        else:
+            n = self.no_episodes
+            self.logger.info(f"Completed environment after {episodes} episodes, last {n}: "
+                             f"mean timesteps {self.time_steps / n:.1f}, mean reward {self.reward / n:.2f}, "
+                             f"won {self.no_won / n * 100:.1f}%, caught {self.no_caught / n * 100:.1f}%, "
+                             f"epsilon {self.epsilon:.4f}, {n / max(now - self.last_time, 1e-9):.0f} episodes/s")
+        self.last_time = now
+        self.clear()
@@ -0,0 +1,129 @@
+import os
+import math
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import Hyper, SEARCH_SPACE, get_config
+from multi_seed import train_grid
+
+# Successive halving sweep over the hyperparameters of SEARCH_SPACE (see config.py).
+# Hyper.sweep_configs configurations are drawn at random and each is trained for
+# Hyper.sweep_min_episodes episodes. The best 1 / Hyper.sweep_eta of them, by the rolling
+# reward, carry on for sweep_eta times as many episodes, and so on until the survivors
+# have trained for Hyper.total_episodes.
+# A survivor carries on from where it stopped rather than starting again: each configuration
+# has a checkpoint in Hyper.sweep_path (see checkpoint.py) holding its Q table, policy epsilon,
+# random streams and metrics, which is loaded for the next rung and saved at the end of it.
+# The checkpoints of the configurations that are dropped are deleted.
+# With Hyper.sweep_mode = "hyperband" several successive halving brackets are run, from
+# many configurations on a small budget to a few on the full budget (Li et al., Hyperband).
+# The rungs are trained in a pool of Hyper.sweep_workers processes (None for one per CPU).
+
+
+def get_random_configs(no_configs, rng, first_id=0):
+    # no_configs configurations with the SEARCH_SPACE settings drawn uniformly at random,
+    # each with its own seed and checkpoint
+    configs = []
+    for config_id in range(first_id, first_id + no_configs):
+        settings = {name: float(rng.uniform(low, high)) for name, (low, high) in SEARCH_SPACE.items()}
+        configs.append(get_config(
+            print_episodes=False,
+            metrics_path=None,
+            seed=Hyper.seed + config_id,
+            checkpoint_interval=0,
+            checkpoint_path=os.path.join(Hyper.sweep_path, f"config_{config_id}"),
+            **settings))
+    return configs
+
+
+def get_budgets(min_episodes, total_episodes, eta):
+    # The episodes trained by the end of each rung. A rung is only added if eta times its
+    # episodes is still within total_episodes, so the last rung is never a tiny one.
+    budgets = []
+    episodes = min_episodes
+    while episodes * eta <= total_episodes:
+        budgets.append(episodes)
+        episodes *= eta
+    budgets.append(total_episodes)
+    return budgets
+
+
+def train_rung(config, episodes):
+    # Runs in a worker process. Carry on from the checkpoint of config, if there is one,
+    # up to episodes episodes and save the checkpoint again.
+    from grid import Pacman_grid
+    from checkpoint import save_checkpoint, load_checkpoint
+    pacman_grid = Pacman_grid(config=config)
+    first_episode = 0
+    if os.path.exists(config.checkpoint_path):
+        first_episode = load_checkpoint(pacman_grid)
+    train_grid(pacman_grid, first_episode, episodes)
+    save_checkpoint(pacman_grid, episodes)
+    rolling = pacman_grid.metrics.rolling
+    return {"reward": rolling.get_mean(), "win_rate": rolling.get_win_rate(), "episodes": episodes - first_episode}
+
+
+class Sweep_runner:
+    def __init__(self, no_workers=None):
+        self.executor = ProcessPoolExecutor(max_workers=no_workers or Hyper.sweep_workers)
+        self.episodes_run = 0
+
+    def successive_halving(self, configs, min_episodes, eta=None):
+        # Returns the surviving configuration and its last result
+        eta = Hyper.sweep_eta if eta is None else eta
+        budgets = get_budgets(min_episodes, Hyper.total_episodes, eta)
+        for rung, episodes in enumerate(budgets):
+            futures = [self.executor.submit(train_rung, config, episodes) for config in configs]
+            results = [future.result() for future in futures]
+            self.episodes_run += sum(result["episodes"] for result in results)
+            order = sorted(range(len(configs)), key=lambda i: results[i]["reward"], reverse=True)
+            no_kept = 1 if rung == len(budgets) - 1 else max(len(configs) // eta, 1)
+            for i in order[no_kept:]:
+                shutil.rmtree(configs[i].checkpoint_path, ignore_errors=True)
+            print(f"Rung {rung + 1} of {len(budgets)}: {len(configs)} configurations trained to {episodes} episodes, "
+                  f"best reward {results[order[0]]['reward']:.2f}, keeping {no_kept}")
+            configs = [configs[i] for i in order[:no_kept]]
+            results = [results[i] for i in order[:no_kept]]
+        return configs[0], results[0]
+
+    def run(self):
+        # Returns the best configuration, its result and the number of configurations tried
+        # Checkpoints left by an earlier sweep would be carried on from, so start afresh
+        shutil.rmtree(Hyper.sweep_path, ignore_errors=True)
+        rng = np.random.default_rng(Hyper.seed)
+        eta = Hyper.sweep_eta
+        if Hyper.sweep_mode == "halving":
+            brackets = [(Hyper.sweep_configs, Hyper.sweep_min_episodes)]
+        elif Hyper.sweep_mode == "hyperband":
+            # Bracket s starts n configurations on total_episodes / eta**s episodes
+            s_max = int(math.log(Hyper.total_episodes / Hyper.sweep_min_episodes, eta) + 1e-9)
+            brackets = [(int(math.ceil((s_max + 1) / (s + 1) * eta ** s)), max(Hyper.total_episodes // eta ** s, 1))
+                        for s in range(s_max, -1, -1)]
+        else:
+            raise ValueError(f"Unknown sweep mode {Hyper.sweep_mode}, expected halving or hyperband")
+        best = None
+        no_configs = 0
+        for no_bracket_configs, min_episodes in brackets:
+            configs = get_random_configs(no_bracket_configs, rng, no_configs)
+            no_configs += no_bracket_configs
+            config, result = self.successive_halving(configs, min_episodes, eta)
+            if best is None or result["reward"] > best[1]["reward"]:
+                if best is not None:
+                    shutil.rmtree(best[0].checkpoint_path, ignore_errors=True)
+                best = (config, result)
+            else:
+                shutil.rmtree(config.checkpoint_path, ignore_errors=True)
+        return best[0], best[1], no_configs
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+def print_summary(config, result, no_configs, episodes_run, seconds):
+    naive_episodes = no_configs * Hyper.total_episodes
+    settings = ", ".join(f"{name} = {getattr(config, name):.4f}" for name in SEARCH_SPACE)
+    print(f"Best of {no_configs} configurations: {settings}")
+    print(f"Final reward {result['reward']:.2f}, win rate {result['win_rate'] * 100:.1f}%, "
+          f"checkpoint in {config.checkpoint_path}")
+    print(f"Episodes run {episodes_run} against {naive_episodes} for training every configuration in full, "
+          f"{(1 - episodes_run / naive_episodes) * 100:.1f}% saved, in {seconds:.1f} s")